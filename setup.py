@@ -26,6 +26,9 @@ setup(
         'Programming Language :: Python',
     ],
     install_requires = parse_requirements('requirements.txt'),
+    extras_require = {
+        'async': ['aiohttp>=3.0'],
+    },
     tests_require = parse_requirements('requirements-test.txt'),
     test_suite = 'test',
     scripts = ['demo.py'],
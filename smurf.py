@@ -1,80 +1,135 @@
 # TODO: Time in current game
 from __future__ import print_function
 from datetime import datetime
-from json import loads
 from math import floor
-from re import search, finditer
-from sys import version_info
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from teamstacks import get_concurrent_players
 
-FORMAT1 = '%b %d, %Y @ %I:%M%p' #May 18, 2013 @ 12:32pm
-FORMAT2 = '%Y %b %d @ %I:%M%p' #May 18 @ 12:32pm
-today = datetime.today()
-
-if version_info.major >= 3:
-    from html.parser import HTMLParser
-else:
-    from HTMLParser import HTMLParser
-
 from steamweb.steamwebbrowser import SteamWebBrowserCfg
+from steamweb.parsers import (parse_achievements, parse_player_achievements, parse_profile,
+                              parse_badges, game_from_json)
+
+today = datetime.today()
 
 def get_game_achievements(swb, game):
     r = swb.get('http://steamcommunity.com/stats/%s/achievements/' % game)
-    achievements = {}
-    for m in finditer('<div class="achievePercent">([\d.]*)%</div>\s*<div class="achieveTxt">\s*<h3>([\w ]*)</h3>\s*<h5>([\w ]*)</h5>\s*</div>', r.content):
-        achievements[m.group(2)] = {'percent': float(m.group(1)), 'desc': m.group(3)}
-    return achievements
+    return dict((a.name, a) for a in parse_achievements(r.text))
 
 def get_player_achievements(swb, game, player):
     r = swb.get('http://steamcommunity.com/%s/stats/%s/achievements/' % (player, game))
-    achievements = {}
-    for m in finditer('<div class="achieveUnlockTime">\s*Unlocked ([\w\d ,@:]*)<br/>\s*</div>\s*<h3 class="ellipsis">([\w ]*)</h3>\s*<h5>([\w ]*)</h5>', r.content):
-        achtime = m.group(1)
-        try:
-            achtime = datetime.strptime(achtime, FORMAT1)
-        except ValueError:
-            achtime = datetime.strptime(str(today.year) + ' ' + achtime, FORMAT2)
-        achievements[m.group(2)] = {'date': achtime, 'desc': m.group(3)}
-    return achievements
+    return dict((a.name, a) for a in parse_player_achievements(r.text, today))
 
 def get_profile_info(swb, player):
     r = swb.get('http://steamcommunity.com/%s' % player)
-    data = {}
-    data['Private'] = 'private_profile' in r.content
-    if not data['Private']:
-        data['Steam Level'] = int(search('<span class="friendPlayerLevelNum">(\d*)</span>', r.content).group(1))
-        for m in finditer('<span class="count_link_label">([\w ]*)</span>\s*&nbsp;\s*<span class="profile_count_link_total">\s*(\d*)\s*</span>', r.content):
-            data[m.group(1)] = int(m.group(2))
-    m = search('<div class="profile_ban">\s*(\d*) VAC ban\(s\) on record\s*<span class="profile_ban_info">\| <a class="whiteLink" href="http://steamcommunity.com/actions/WhatIsVAC">Info</a></span>\s*</div>\s*(\d*) day\(s\) since last ban\s*</div>', r.content)
-    if m:
-        data['Vac Ban'] = {'Count': int(m.group(1)), 'Days': int(m.group(2))}
-    return data
+    return parse_profile(r.text)
 
 def get_game_playtimes(swb, player):
-    r = swb.get('http://steamcommunity.com/%s/games/?tab=all' % player)
-    rgGames = search('var rgGames = (.*);', r.content).group(1)
-    rgGames = rgGames.strip().replace('\\/', '/')
-    return loads(rgGames)
+    ''' Yields the games of player while the page is downloaded '''
+    games = swb.iter_json_array('http://steamcommunity.com/%s/games/?tab=all' % player, 'var rgGames = ')
+    return (game_from_json(g) for g in games)
 
 def get_badges(swb, player):
     r = swb.get('http://steamcommunity.com/%s/badges/' % player)
-    if 'g_rgDelayedLoadImages' in r.content:
-        images = loads(search('g_rgDelayedLoadImages=(.*?);', r.content).group(1))
-    badges = {}
-    for m in finditer('<div class="badge_info_image">\s*<img src="http://steamcommunity-a.akamaihd.net/public/shared/images/trans.gif" id="delayedimage_(.*?)_0">\s*</div>\s*<div class="badge_info_description">\s*<div class="badge_info_title">(.*?)</div>\s*<div>(\s*Level \d+,|)\s*(\d+) XP\s*</div>\s*<div class="badge_info_unlocked">\s*Unlocked (.*?)\s*</div>', r.content):
-        name = m.group(2)
-        badges[name] = {}
-        badges[name]['file'] = images[m.group(1)][0]
-        if m.group(3) != '':
-            badges[name]['level'] = int(m.group(3).strip()[6:-1])
-        badges[name]['xp'] = int(m.group(4))
-        date = m.group(5)
-        try:
-            date = datetime.strptime(date, FORMAT1)
-        except ValueError:
-            date = datetime.strptime(str(today.year) + ' ' + date, FORMAT2)
-        badges[name]['date'] = date
-    return badges
+    return dict((b.name, b) for b in parse_badges(r.text, today))
+
+def get_total_hours(swb, player):
+    return sum(game.hours_forever for game in get_game_playtimes(swb, player))
+
+class PlayerDossier(object):
+    ''' Profile, badges and total playtime of a player and the smurf score derived from them '''
+    def __init__(self, player, name):
+        self.player = player
+        self.name = name
+        self.profile = None
+        self.badges = None
+        self.total_hours = None
+        self.errors = {} # Failed fetches, ignored for private profiles
+
+    @property
+    def complete(self):
+        if self.profile is None:
+            return False
+        return self.profile.private or (self.badges is not None and self.total_hours is not None)
+
+    def score(self):
+        ''' Returns a dict with the facts and the "Strikes" of the player, the more the likelier a smurf '''
+        data = {'Name': self.name, 'Strikes': 0.0}
+        if self.profile.vac_ban_days is not None:
+            data['Vac Bans'] = self.profile.vac_bans
+            data['Vac Age'] = self.profile.vac_ban_days * 24
+            data['Strikes'] -= data['Vac Age'] / 8760.0 # 1 year
+        else:
+            data['Vac Bans'] = 0
+        data['Strikes'] += data['Vac Bans']
+
+        if self.profile.private:
+            data['Private'] = True
+            data['Strikes'] += 1
+            return data
+
+        date = today
+        if 'Years of Service' in self.badges:
+            xp = self.badges['Years of Service'].xp
+            date = self.badges['Years of Service'].unlocked
+            # 50 xp per year of service. The icons are unique as well, but hashed.
+            date = date.replace(year=date.year - xp//50)
+        else: # Use the oldest badge
+            for badge in self.badges.values():
+                if badge.unlocked < date:
+                    date = badge.unlocked
+        date = today-date
+        data['Account Age'] = date.days * 24 + date.seconds / 3600.0
+        data['Strikes'] += 1 - (data['Account Age'] / 17520.0) # 2 years oldold
+
+        data['Total Game Time'] = self.total_hours
+        data['Strikes'] += 1 - (self.total_hours / 720.0) # 1 month total playtime
+
+        data['Friends'] = self.profile.counts.get('Friends', 0)
+        data['Strikes'] += 1 - (data['Friends'] / 50.0)
+
+        data['Steam Level'] = self.profile.level or 0
+        data['Strikes'] += 1 - (data['Steam Level'] / 3.0)
+
+        data['Games'] = self.profile.counts.get('Games', 0)
+        data['Strikes'] += 1 - (data['Games'] / 30.0)
+        return data
+
+def iter_dossiers(swb, players, names, executor):
+    ''' Fetch the pages of all players at once and yield each PlayerDossier as soon as it is complete.
+    Badges and games of private profiles are skipped: cancelled if not started yet, ignored otherwise.
+    To score many matches concurrently, share one executor.
+
+    Args:
+        swb: A logged in SteamWebBrowser.
+        players: List of profile paths.
+        names: Dict of profile path to player name.
+        executor: A concurrent.futures.Executor to fetch the pages with.
+    '''
+    dossiers = dict((player, PlayerDossier(player, names[player])) for player in players)
+    futures = {}
+    for player in players:
+        futures[executor.submit(get_profile_info, swb, player)] = (player, 'profile')
+        futures[executor.submit(get_badges, swb, player)] = (player, 'badges')
+        futures[executor.submit(get_total_hours, swb, player)] = (player, 'total_hours')
+    for f in as_completed(futures):
+        player, field = futures[f]
+        dossier = dossiers.get(player)
+        if dossier is None or f.cancelled():
+            # Already complete
+            continue
+        if f.exception() is not None and field != 'profile':
+            dossier.errors[field] = f.exception()
+        else:
+            setattr(dossier, field, f.result())
+        if field == 'profile' and dossier.profile.private:
+            for other, (other_player, _) in futures.items():
+                if other_player == player:
+                    other.cancel()
+        if dossier.profile is not None and not dossier.profile.private and dossier.errors:
+            raise list(dossier.errors.values())[0]
+        if dossier.complete:
+            del dossiers[player]
+            yield dossier
 
 if __name__ == "__main__":
     def format_time(hours):
@@ -104,61 +159,17 @@ if __name__ == "__main__":
         swb.login()
     players, playerNames = get_concurrent_players(swb)
 
-    playerData = []
-
-    for player in players:
-        playerData.append({'Name': playerNames[player], 'Strikes': 0.0})
-
-        profile_info = get_profile_info(swb, player)
-        if 'Vac Ban' in profile_info:
-            playerData[-1]['Vac Bans'] = int(profile_info['Vac Ban']['Count'])
-            playerData[-1]['Vac Age'] = profile_info['Vac Ban']['Days'] * 24
-            playerData[-1]['Strikes'] -= playerData[-1]['Vac Age'] / 8760.0 # 1 year
-        else:
-            playerData[-1]['Vac Bans'] = 0
-        playerData[-1]['Strikes'] += playerData[-1]['Vac Bans']
-
-        if profile_info['Private']:
-            playerData[-1]['Private'] = True
-            playerData[-1]['Strikes'] += 1
-            continue
+    # Fetch the profile, badges and games of every player at once, in about one round trip
+    workers = 3 * len(players)
+    swb.session.get_adapter('https://steamcommunity.com').close()
+    adapter = swb.make_adapter(pool_maxsize=workers)
+    swb.session.mount('http://', adapter)
+    swb.session.mount('https://', adapter)
 
-        badges = get_badges(swb, player)
-        games = get_game_playtimes(swb, player)
-
-        date = today
-        if 'Years of Service' in badges:
-            xp = badges['Years of Service']['xp']
-            date = badges['Years of Service']['date']
-            # 50 xp per year of service. The icons are unique as well, but hashed.
-            date = date.replace(year=date.year - xp/50)
-        else: # Use the oldest badge
-            for badge in badges:
-                if badges[badge]['date'] < date:
-                    date = badges[badge]['date']
-        date = today-date
-        playerData[-1]['Account Age'] = date.days * 24 + date.seconds / 3600.0
-
-        playerData[-1]['Strikes'] += 1 - (playerData[-1]['Account Age'] / 17520.0) # 2 years oldold
-
-        total_hours = 0.0
-        for game in games:
-            if 'hours_forever' in game:
-                total_hours += float(game['hours_forever'].replace(',', ''))
-        playerData[-1]['Total Game Time'] = total_hours
-        playerData[-1]['Strikes'] += 1 - (total_hours / 720.0) # 1 month total playtime
-
-        if 'Friends' in profile_info:
-            playerData[-1]['Friends'] = profile_info['Friends']
-        else:
-            playerData[-1]['Friends'] = 0
-        playerData[-1]['Strikes'] += 1 - (playerData[-1]['Friends'] / 50.0)
-
-        playerData[-1]['Steam Level'] = profile_info['Steam Level']
-        playerData[-1]['Strikes'] += 1 - (playerData[-1]['Steam Level'] / 3.0)
-
-        playerData[-1]['Games'] = profile_info['Games']
-        playerData[-1]['Strikes'] += 1 - (playerData[-1]['Games'] / 30.0)
+    playerData = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for dossier in iter_dossiers(swb, players, playerNames, executor):
+            playerData.append(dossier.score())
 
     playerData.append({'Strikes': -0.01, 'SIGNAL':'\tThese players are probably smurfs:'})
     playerData.append({'Strikes': 1.001, 'SIGNAL':'\tThese players are definitely smurfs:'})
@@ -1,2 +1,8 @@
 from .steamwebbrowser import SteamWebBrowser
 from .steamwebbrowser import SteamWebBrowserCfg
+from .steamwebbrowser import LoginChallenge
+from .steamwebbrowserpool import SteamWebBrowserPool
+from .responsecache import ResponseCache
+from .friendgraph import FriendGraph
+from .ratelimiter import RateLimiter
+from .sessionstore import SQLiteSessionStore
@@ -0,0 +1,71 @@
+import os
+import time
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+class FileLock(object):
+    ''' Exclusive lock shared between processes, held on a separate lock file.
+
+    Uses flock() on POSIX and msvcrt.locking() on Windows. Every acquire() opens the
+    lock file anew, so instances for the same path exclude each other within one process
+    as well. An instance must not be shared between threads and is not reentrant.
+
+    Usage:
+        with FileLock(cookie_file + '.lock'):
+            ...
+    '''
+    def __init__(self, path, poll_interval=0.05):
+        ''' Args:
+                path: The lock file, created if it does not exist.
+                poll_interval: Optional. Seconds between attempts while waiting with a timeout.
+        '''
+        self.path = path
+        self.poll_interval = poll_interval
+        self._fd = None
+
+    def _try_lock(self, fd):
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except (IOError, OSError):
+            return False
+        return True
+
+    def acquire(self, timeout=None):
+        ''' Wait up to timeout seconds (forever if None) for the lock.
+            Returns True if the lock has been acquired, False on timeout.
+        '''
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if timeout is None and fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            self._fd = fd
+            return True
+        deadline = None if timeout is None else time.time() + timeout
+        while not self._try_lock(fd):
+            if deadline is not None and time.time() >= deadline:
+                os.close(fd)
+                return False
+            time.sleep(self.poll_interval)
+        self._fd = fd
+        return True
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        os.close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
@@ -0,0 +1,99 @@
+import time
+from threading import Lock
+
+class FriendGraph(object):
+    ''' Friend lists of players stored in a SQLite database.
+
+    Every player's friend list is stored with the time it was fetched, so only
+    unknown or stale players need to be fetched again.
+
+    Usage:
+        graph = FriendGraph(os.path.join(swb.appdata_path, 'friendgraph.sqlite'))
+        graph.refresh(players, lambda stale: teamstacks.get_friend_sets(swb, stale))
+        connections = graph.connections(players)
+    '''
+    # SQLite limits the number of parameters of a statement
+    max_parameters = 500
+
+    def __init__(self, path, max_age=86400):
+        ''' Args:
+                path: Database file, ":memory:" for a temporary graph.
+                max_age: Optional. Seconds after which a friend list is stale.
+        '''
+        self.max_age = max_age
+        self._lock = Lock()
+        import sqlite3
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS players ('
+                             'player TEXT PRIMARY KEY, fetched_at REAL NOT NULL)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS friends ('
+                             'player TEXT NOT NULL, friend TEXT NOT NULL, PRIMARY KEY (player, friend))')
+
+    def close(self):
+        self._db.close()
+
+    def _chunks(self, players):
+        players = list(players)
+        for i in range(0, len(players), self.max_parameters):
+            yield players[i:i + self.max_parameters]
+
+    def stale(self, players, now=None):
+        ''' Returns the players which have never been fetched or are older than max_age '''
+        players = list(players)
+        oldest = (now or time.time()) - self.max_age
+        fresh = set()
+        with self._lock:
+            for chunk in self._chunks(players):
+                fresh.update(row[0] for row in self._db.execute(
+                    'SELECT player FROM players WHERE fetched_at >= ? AND player IN (%s)' % ','.join('?' * len(chunk)),
+                    [oldest] + chunk))
+        return [p for p in players if p not in fresh]
+
+    def update(self, friend_sets, now=None):
+        ''' Store friend lists.
+
+        Args:
+            friend_sets: Dict of player -> iterable of friends.
+        '''
+        now = now or time.time()
+        with self._lock, self._db:
+            for player, friends in friend_sets.items():
+                self._db.execute('DELETE FROM friends WHERE player = ?', (player, ))
+                self._db.executemany('INSERT OR IGNORE INTO friends (player, friend) VALUES (?, ?)',
+                                     ((player, friend) for friend in friends))
+                self._db.execute('INSERT OR REPLACE INTO players (player, fetched_at) VALUES (?, ?)',
+                                 (player, now))
+
+    def refresh(self, players, fetch):
+        ''' Fetch the friend lists of unknown or stale players.
+
+        Args:
+            players: List of players.
+            fetch: Function taking a list of players and returning a dict of player -> friends.
+
+        Returns:
+            The list of players that have been fetched.
+        '''
+        stale = self.stale(players)
+        if stale:
+            self.update(fetch(stale))
+        return stale
+
+    def friends(self, player):
+        ''' Returns the stored friends of player as set '''
+        with self._lock:
+            return set(row[0] for row in self._db.execute('SELECT friend FROM friends WHERE player = ?', (player, )))
+
+    def connections(self, players):
+        ''' Returns a dict of player -> set of friends among players (for each of players) '''
+        players = list(players)
+        wanted = set(players)
+        connections = dict((player, set()) for player in players)
+        with self._lock:
+            for chunk in self._chunks(players):
+                for player, friend in self._db.execute(
+                        'SELECT player, friend FROM friends WHERE player IN (%s)' % ','.join('?' * len(chunk)), chunk):
+                    if friend in wanted:
+                        connections[player].add(friend)
+        return connections
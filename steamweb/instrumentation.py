@@ -0,0 +1,187 @@
+''' Instrumentation of SteamWebBrowser.get() and post()
+
+Instruments are added with SteamWebBrowser.add_instrument(). Before a request is sent
+their before_request() is called with a RequestInfo, after it finished (successful or
+not) after_request() is called with the same, now complete, RequestInfo.
+
+    metrics = MetricsAggregator([('profile', r'/(id|profiles)/[^/]+/?$'), ('badges', r'/badges/')])
+    swb.add_instrument(metrics)
+    ...
+    print(prometheus_text(metrics))
+'''
+import re
+import time
+from threading import Lock
+
+class RequestInfo(object):
+    ''' Measurements of one get() or post() call.
+
+    Attributes:
+        method: "GET" or "POST".
+        url: The URL.
+        started: time.time() when the call started.
+        timings: Dict of phase -> seconds. Phases are
+            "response": Sending the request until the response headers arrived
+                (DNS, connect, TLS, server time; all attempts if urllib3 retried).
+            "download": Reading the response body (0 for streamed responses).
+            "save_cookies": Writing changed cookies (_save_cookies()).
+            "relogin": Logging in again after the session expired.
+            "total": The whole call, including the request sent again after a relogin.
+        status_code: HTTP status code of the response, None if there was none.
+        size: Size of the response body in bytes, None for streamed responses.
+        retries: Number of retries done by urllib3.
+        cached: True if the response was answered by the response cache without a request.
+        cookies_saved: True if _save_cookies() ran.
+        relogin: True if the session expired and a login was done.
+        error: The exception raised, None on success.
+    '''
+    def __init__(self, method, url):
+        self.method = method
+        self.url = url
+        self.started = time.time()
+        self.timings = {}
+        self.status_code = None
+        self.size = None
+        self.retries = 0
+        self.cached = False
+        self.cookies_saved = False
+        self.relogin = False
+        self.error = None
+
+    def timed(self, phase, start):
+        ''' Add the seconds since start (a time.time() value) to phase '''
+        self.timings[phase] = self.timings.get(phase, 0.0) + time.time() - start
+
+    def response(self, r, start, stream=False):
+        ''' Record the response r of a request sent at start '''
+        elapsed = time.time() - start
+        self.status_code = r.status_code
+        # requests measures the time until the headers have been parsed
+        response_time = min(elapsed, r.elapsed.total_seconds()) if getattr(r, 'elapsed', None) else elapsed
+        self.timings['response'] = self.timings.get('response', 0.0) + response_time
+        self.timings['download'] = self.timings.get('download', 0.0) + elapsed - response_time
+        if not stream:
+            self.size = len(r.content)
+        retries = getattr(getattr(r, 'raw', None), 'retries', None)
+        if retries is not None and retries.history:
+            self.retries += len(retries.history)
+
+    def finish(self):
+        self.timings['total'] = time.time() - self.started
+
+class Instrument(object):
+    ''' Base class for instruments, override the hooks you need.
+        Hooks may be called from several threads at once.
+    '''
+    def before_request(self, info):
+        pass
+
+    def after_request(self, info):
+        pass
+
+class _Stats(object):
+    def __init__(self, buckets):
+        self.statuses = {} # status code (or "error"/"cached") -> count
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.duration = 0.0
+        self.phases = {}
+        self.size = 0
+        self.retries = 0
+        self.cookie_saves = 0
+        self.relogins = 0
+
+class MetricsAggregator(Instrument):
+    ''' Collects counts and latency histograms in memory, grouped by method and URL pattern.
+        See prometheus_text() to export them.
+    '''
+    default_buckets = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, patterns=(), buckets=default_buckets):
+        ''' Args:
+                patterns: Optional. Iterable of (name, regex) tuples. A URL is counted under the name
+                    of the first regex that matches (re.search), "other" if none does.
+                buckets: Optional. Upper bounds in seconds of the latency histogram buckets.
+        '''
+        self.patterns = [(name, re.compile(pattern)) for name, pattern in patterns]
+        self.buckets = tuple(sorted(buckets))
+        self.stats = {} # (method, pattern name) -> _Stats
+        self._lock = Lock()
+
+    def pattern(self, url):
+        ''' Returns the name of the pattern url is counted under '''
+        for name, pattern in self.patterns:
+            if pattern.search(url):
+                return name
+        return 'other'
+
+    def after_request(self, info):
+        key = (info.method, self.pattern(info.url))
+        if info.error is not None and info.status_code is None:
+            status = 'error'
+        elif info.cached:
+            status = 'cached'
+        else:
+            status = str(info.status_code)
+        duration = info.timings.get('total', 0.0)
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = _Stats(self.buckets)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.count += 1
+            stats.duration += duration
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    stats.bucket_counts[i] += 1
+            for phase, seconds in info.timings.items():
+                if phase != 'total':
+                    stats.phases[phase] = stats.phases.get(phase, 0.0) + seconds
+            stats.size += info.size or 0
+            stats.retries += info.retries
+            stats.cookie_saves += int(info.cookies_saved)
+            stats.relogins += int(info.relogin)
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+
+def _labels(**labels):
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for name, value in sorted(labels.items()))
+
+def prometheus_text(aggregator, prefix='steamweb'):
+    ''' Returns the metrics of a MetricsAggregator in the Prometheus text exposition format '''
+    with aggregator._lock: # pylint:disable=protected-access
+        stats = sorted(aggregator.stats.items(), key=lambda item: item[0])
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help_text))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+            for suffix, labels, value in samples:
+                lines.append('%s_%s%s%s %r' % (prefix, name, suffix, _labels(**labels), value))
+
+        metric('requests_total', 'counter', 'Requests by status code ("cached": answered by the response cache)',
+               [('', dict(method=m, pattern=p, status=status), count)
+                for (m, p), s in stats for status, count in sorted(s.statuses.items())])
+        samples = []
+        for (m, p), s in stats:
+            for bound, count in zip(aggregator.buckets, s.bucket_counts):
+                samples.append(('_bucket', dict(method=m, pattern=p, le=repr(float(bound))), count))
+            samples.append(('_bucket', dict(method=m, pattern=p, le='+Inf'), s.count))
+            samples.append(('_sum', dict(method=m, pattern=p), s.duration))
+            samples.append(('_count', dict(method=m, pattern=p), s.count))
+        metric('request_duration_seconds', 'histogram', 'Duration of get() and post() calls', samples)
+        metric('request_phase_seconds_total', 'counter', 'Time spent per phase of the requests',
+               [('', dict(method=m, pattern=p, phase=phase), seconds)
+                for (m, p), s in stats for phase, seconds in sorted(s.phases.items())])
+        metric('response_bytes_total', 'counter', 'Size of the response bodies',
+               [('', dict(method=m, pattern=p), s.size) for (m, p), s in stats])
+        metric('retries_total', 'counter', 'Retries done by urllib3',
+               [('', dict(method=m, pattern=p), s.retries) for (m, p), s in stats])
+        metric('cookie_saves_total', 'counter', 'Requests after which changed cookies were saved',
+               [('', dict(method=m, pattern=p), s.cookie_saves) for (m, p), s in stats])
+        metric('relogins_total', 'counter', 'Logins done because the session expired',
+               [('', dict(method=m, pattern=p), s.relogins) for (m, p), s in stats])
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,148 @@
+''' Extractors for steamcommunity.com pages
+
+All parsers take the page as text (response.text, not response.content), scan it with
+precompiled regular expressions (profile and badges pages in a single pass) and return namedtuples.
+'''
+import re
+import json
+from collections import namedtuple
+from datetime import datetime
+from sys import version_info
+if version_info.major >= 3: # Python 3
+    from html import unescape
+else: # Python 2
+    from HTMLParser import HTMLParser
+    unescape = HTMLParser().unescape
+
+DATE_FORMAT = '%b %d, %Y @ %I:%M%p' # May 18, 2013 @ 12:32pm
+DATE_FORMAT_CURRENT_YEAR = '%Y %b %d @ %I:%M%p' # May 18 @ 12:32pm (year prepended)
+
+class ProfileInfo(namedtuple('ProfileInfo', 'private level counts vac_bans vac_ban_days')):
+    ''' counts maps labels like "Games", "Friends" or "Badges" to numbers.
+        vac_ban_days is None if there is no VAC ban on record.
+    '''
+    __slots__ = ()
+
+Badge = namedtuple('Badge', 'name image level xp unlocked')
+Achievement = namedtuple('Achievement', 'name description percent')
+PlayerAchievement = namedtuple('PlayerAchievement', 'name description unlocked')
+Player = namedtuple('Player', 'path name')
+Game = namedtuple('Game', 'appid name hours_forever')
+
+_PROFILE_RE = re.compile(
+    r'(?P<private>private_profile)'
+    r'|<span class="friendPlayerLevelNum">(?P<level>\d+)</span>'
+    r'|<span class="count_link_label">(?P<label>[\w ]*)</span>\s*&nbsp;\s*'
+        r'<span class="profile_count_link_total">\s*(?P<count>[\d,]+)\s*</span>'
+    r'|<div class="profile_ban">\s*(?P<bans>\d+) VAC ban\(s\) on record\s*'
+        r'<span class="profile_ban_info">[^<]*<a [^>]*>[^<]*</a></span>\s*</div>\s*'
+        r'(?P<days>\d+) day\(s\) since last ban'
+)
+
+_BADGES_RE = re.compile(
+    r'<div class="badge_info_image">\s*<img src="[^"]*" id="delayedimage_(?P<image>.*?)_0">\s*</div>\s*'
+        r'<div class="badge_info_description">\s*<div class="badge_info_title">(?P<name>.*?)</div>\s*'
+        r'<div>(?:\s*Level (?P<level>\d+),)?\s*(?P<xp>\d+) XP\s*</div>\s*'
+        r'<div class="badge_info_unlocked">\s*Unlocked (?P<unlocked>.*?)\s*</div>'
+    r'|g_rgDelayedLoadImages=(?P<images>.*?);'
+)
+
+_ACHIEVEMENTS_RE = re.compile(
+    r'<div class="achievePercent">(?P<percent>[\d.]*)%</div>\s*<div class="achieveTxt">\s*'
+    r'<h3>(?P<name>[^<]*)</h3>\s*<h5>(?P<description>[^<]*)</h5>\s*</div>'
+)
+
+_PLAYER_ACHIEVEMENTS_RE = re.compile(
+    r'<div class="achieveUnlockTime">\s*Unlocked (?P<unlocked>[\w ,@:]*)<br\s*/>\s*</div>\s*'
+    r'<h3 class="ellipsis">(?P<name>[^<]*)</h3>\s*<h5>(?P<description>[^<]*)</h5>'
+)
+
+_FRIENDS_RE = re.compile(r'<a class="friendBlockLinkOverlay" href="https?://steamcommunity\.com/(.*?)"')
+
+_CONCURRENT_PLAYERS_RE = re.compile(
+    r'<a class="friendBlockLinkOverlay" href="https?://steamcommunity\.com/(.*?)".*?<div>(.*?)<br />', re.DOTALL)
+_SELF_RE = re.compile(r'<a href="https?://steamcommunity\.com/([^"]*)" data-miniprofile="\d*">(.*?)</a>')
+
+_GAMES_RE = re.compile(r'var rgGames = (.*?);\s*$', re.MULTILINE)
+
+def parse_date(text, today=None):
+    ''' Parse dates like "May 18, 2013 @ 12:32pm" or "May 18 @ 12:32pm" (current year) '''
+    try:
+        return datetime.strptime(text, DATE_FORMAT)
+    except ValueError:
+        today = today or datetime.today()
+        return datetime.strptime('%d %s' % (today.year, text), DATE_FORMAT_CURRENT_YEAR)
+
+def parse_profile(text):
+    ''' Returns the ProfileInfo of a profile page '''
+    private = False
+    level = None
+    counts = {}
+    vac_bans = 0
+    vac_ban_days = None
+    for m in _PROFILE_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == 'private':
+            private = True
+        elif kind == 'level':
+            level = int(m.group(kind))
+        elif kind == 'count':
+            counts[m.group('label')] = int(m.group(kind).replace(',', ''))
+        else:
+            vac_bans = int(m.group('bans'))
+            vac_ban_days = int(m.group(kind))
+    return ProfileInfo(private, level, counts, vac_bans, vac_ban_days)
+
+def parse_badges(text, today=None):
+    ''' Returns a list of Badge of a badges page. image is the URL of the badge image. '''
+    badges = []
+    images = {}
+    for m in _BADGES_RE.finditer(text):
+        if m.lastgroup == 'images':
+            images = json.loads(m.group('images'))
+            continue
+        level = m.group('level')
+        badges.append(Badge(
+            unescape(m.group('name')),
+            m.group('image'), # resolved below, images are listed after the badges
+            int(level) if level else None,
+            int(m.group('xp')),
+            parse_date(m.group('unlocked'), today),
+        ))
+    return [b._replace(image=images[b.image][0]) if b.image in images else b for b in badges]
+
+def parse_achievements(text):
+    ''' Returns a list of Achievement of a global achievements page (/stats/<appid>/achievements/) '''
+    return [Achievement(unescape(name), unescape(description), float(percent))
+            for percent, name, description in _ACHIEVEMENTS_RE.findall(text)]
+
+def parse_player_achievements(text, today=None):
+    ''' Returns a list of PlayerAchievement of the unlocked achievements on a player's achievements page '''
+    return [PlayerAchievement(unescape(name), unescape(description), parse_date(unlocked, today))
+            for unlocked, name, description in _PLAYER_ACHIEVEMENTS_RE.findall(text)]
+
+def parse_friends(text):
+    ''' Returns the profile paths (e.g. "id/name" or "profiles/<steamid>") on a friends page '''
+    return _FRIENDS_RE.findall(text)
+
+def parse_concurrent_players(text):
+    ''' Returns a list of Player on the "players" page (/my/friends/players).
+        The player who is logged in is the last one.
+    '''
+    players = [Player(path, unescape(name.strip())) for path, name in _CONCURRENT_PLAYERS_RE.findall(text)]
+    m = _SELF_RE.search(text)
+    if m is not None:
+        players.append(Player(m.group(1), unescape(m.group(2))))
+    return players
+
+def game_from_json(game):
+    ''' Converts an element of rgGames (see SteamWebBrowser.iter_json_array()) into a Game '''
+    hours = game.get('hours_forever')
+    return Game(game['appid'], game['name'], float(hours.replace(',', '')) if hours else 0.0)
+
+def parse_games(text):
+    ''' Returns a list of Game of a games page (/<player>/games/?tab=all) '''
+    m = _GAMES_RE.search(text)
+    if m is None:
+        return []
+    return [game_from_json(g) for g in json.loads(m.group(1))]
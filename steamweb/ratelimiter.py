@@ -0,0 +1,154 @@
+import time
+import logging
+from email.utils import parsedate_tz, mktime_tz
+from threading import Lock
+from sys import version_info
+from requests.adapters import HTTPAdapter
+if version_info.major >= 3: # Python 3
+    from urllib.parse import urlparse
+else: # Python 2
+    from urlparse import urlparse
+
+# Status codes Steam answers with when requests come in too fast
+THROTTLE_STATUS_CODES = (429, 503)
+
+def parse_retry_after(value, now=None):
+    ''' Returns the seconds to wait from a Retry-After header (seconds or HTTP date) or None '''
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    return max(0.0, mktime_tz(date) - (now or time.time()))
+
+class _Bucket(object):
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.tokens = float(burst)
+        self.updated = time.time()
+        self.paused_until = 0
+
+class RateLimiter(object):
+    ''' Token bucket rate limiter with one bucket per host, safe to share between threads,
+    browsers and SteamWebBrowserPool (see SteamWebBrowser.make_adapter()).
+
+    The rate adapts to the server (additive increase, multiplicative decrease): every
+    throttled response (429 or 503) multiplies the rate of its host by decrease and
+    pauses the host for the time given in Retry-After. Every other response raises the
+    rate again by about increase requests per second, for each second at full rate.
+    '''
+    def __init__(self, rate=5.0, burst=10, min_rate=0.2, max_rate=20.0, increase=0.5, decrease=0.5,
+                rates=None): # pylint:disable=too-many-arguments
+        ''' Args:
+                rate: Optional. Initial requests per second for every host.
+                burst: Optional. Number of requests that may be sent at once after idling.
+                min_rate: Optional. The rate never drops below this.
+                max_rate: Optional. The rate never rises above this.
+                increase: Optional. Requests per second added per second of successful requests.
+                decrease: Optional. Factor the rate is multiplied with on a throttled response.
+                rates: Optional. Dict of host -> initial rate, overriding rate.
+        '''
+        self.logger = logging.getLogger(str(__name__)+'.'+str(self.__class__.__name__))
+        self.initial_rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.rates = dict(rates or {})
+        self.throttled_count = 0
+        self._buckets = {}
+        self._lock = Lock()
+
+    def _bucket(self, host):
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = _Bucket(self.rates.get(host, self.initial_rate), self.burst)
+        return bucket
+
+    def rate(self, host):
+        ''' Returns the current requests per second for host '''
+        with self._lock:
+            return self._bucket(host).rate
+
+    def reserve(self, host):
+        ''' Takes a token for host and returns the seconds to wait before sending the request '''
+        with self._lock:
+            bucket = self._bucket(host)
+            now = time.time()
+            start = max(now, bucket.paused_until)
+            if start > bucket.updated:
+                bucket.tokens = min(self.burst, bucket.tokens + (start - bucket.updated) * bucket.rate)
+                bucket.updated = start
+            # Tokens may become negative, later callers queue up behind earlier ones
+            bucket.tokens -= 1
+            wait = start - now
+            if bucket.tokens < 0:
+                wait += -bucket.tokens / bucket.rate
+            return wait
+
+    def acquire(self, host):
+        ''' Blocks until a request to host may be sent. Returns the seconds waited. '''
+        wait = self.reserve(host)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def succeeded(self, host):
+        ''' The request to host was not throttled '''
+        with self._lock:
+            bucket = self._bucket(host)
+            bucket.rate = min(self.max_rate, bucket.rate + self.increase / bucket.rate)
+
+    def throttled(self, host, retry_after=None):
+        ''' The request to host was throttled, slow down.
+
+        Args:
+            host: The host.
+            retry_after: Optional. Seconds to pause all requests to host.
+        '''
+        with self._lock:
+            self.throttled_count += 1
+            bucket = self._bucket(host)
+            bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+            now = time.time()
+            pause = retry_after if retry_after is not None else 1 / bucket.rate
+            bucket.paused_until = max(bucket.paused_until, now + pause)
+            # Drop the burst, start refilling after the pause
+            bucket.tokens = min(bucket.tokens, 0)
+            bucket.updated = max(bucket.updated, bucket.paused_until)
+            self.logger.warning('Throttled by %s, pausing %.1f seconds, rate is now %.2f requests/s',
+                                host, pause, bucket.rate)
+
+class RateLimitedAdapter(HTTPAdapter):
+    ''' HTTPAdapter sending requests through a RateLimiter.
+        Throttled requests (429 or 503) are sent again up to throttle_retries times.
+    '''
+    def __init__(self, rate_limiter, throttle_retries=3, **kwargs):
+        ''' Args:
+                rate_limiter: The RateLimiter.
+                throttle_retries: Optional. How often to resend a throttled request.
+                kwargs: Passed to HTTPAdapter.
+        '''
+        self.rate_limiter = rate_limiter
+        self.throttle_retries = throttle_retries
+        super(RateLimitedAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs): # pylint:disable=arguments-differ
+        host = urlparse(request.url).hostname
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(host)
+            r = super(RateLimitedAdapter, self).send(request, **kwargs)
+            if r.status_code not in THROTTLE_STATUS_CODES:
+                self.rate_limiter.succeeded(host)
+                return r
+            self.rate_limiter.throttled(host, parse_retry_after(r.headers.get('Retry-After')))
+            if attempt >= self.throttle_retries:
+                return r
+            attempt += 1
+            r.close()
@@ -0,0 +1,186 @@
+import os
+import re
+import stat
+import json
+import time
+import logging
+from base64 import b64encode, b64decode
+from collections import OrderedDict
+from hashlib import sha1
+from threading import Lock
+from sys import version_info
+from requests import Response
+from requests.models import PreparedRequest
+from requests.structures import CaseInsensitiveDict
+if version_info.major >= 3: # Python 3
+    from os import replace as rename_file
+else: # Python 2
+    from os import rename as rename_file
+
+class ResponseCache(object):
+    ''' LRU cache for responses of SteamWebBrowser.get() with per URL pattern TTLs.
+
+    Only URLs matching one of the patterns are cached. Entries are keyed by account and
+    URL (including query parameters) so pages of different accounts never mix. Other
+    request arguments (headers, ...) are not part of the key.
+
+    Expired responses with an ETag or Last-Modified header are kept to revalidate them
+    with a conditional request (see lookup()). A TTL of 0 always revalidates.
+    '''
+    def __init__(self, ttls, maxsize=256, path=None):
+        ''' Args:
+                ttls: Iterable of (regex, seconds) tuples. The first regex that matches (re.search)
+                    a URL sets the time to live of its response.
+                maxsize: Optional. Maximum number of responses kept in memory.
+                path: Optional. Directory to persist responses in, so they survive restarts.
+        '''
+        self.logger = logging.getLogger(str(__name__)+'.'+str(self.__class__.__name__))
+        self.ttls = [(re.compile(pattern), ttl) for pattern, ttl in ttls]
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._entries = OrderedDict() # key -> (expires, response)
+        self._lock = Lock()
+        if path is not None and not os.path.isdir(path):
+            os.mkdir(path, stat.S_IRWXU)
+
+    def ttl(self, url):
+        ''' Returns the TTL for url or None if it is not cached '''
+        for pattern, ttl in self.ttls:
+            if pattern.search(url):
+                return ttl
+        return None
+
+    @staticmethod
+    def key(account, url, params=None):
+        ''' Returns the cache key for a request of account '''
+        p = PreparedRequest()
+        p.prepare_url(url, params)
+        return '%s\n%s' % (account, p.url)
+
+    def get(self, key, url):
+        ''' Returns the cached response for key or None '''
+        return self.lookup(key, url)[0]
+
+    def lookup(self, key, url):
+        ''' Returns a tuple (response, stale):
+            response is the cached response if it has not expired, else None.
+            stale is the expired response if it can be revalidated, else None.
+        '''
+        if self.ttl(url) is None:
+            return None, None
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                # Re-insert as most recently used
+                self._entries[key] = entry
+        if entry is None and self.path is not None:
+            entry = self._load(key)
+            if entry is not None:
+                self._remember(key, entry)
+        if entry is None or entry[0] <= time.time():
+            with self._lock:
+                self.misses += 1
+            if entry is not None and self._has_validators(entry[1]):
+                return None, entry[1]
+            return None, None
+        with self._lock:
+            self.hits += 1
+        return entry[1], None
+
+    @staticmethod
+    def _has_validators(r):
+        return 'ETag' in r.headers or 'Last-Modified' in r.headers
+
+    @staticmethod
+    def conditional_headers(stale):
+        ''' Returns the headers to revalidate the stale response '''
+        headers = {}
+        if 'ETag' in stale.headers:
+            headers['If-None-Match'] = stale.headers['ETag']
+        if 'Last-Modified' in stale.headers:
+            headers['If-Modified-Since'] = stale.headers['Last-Modified']
+        return headers
+
+    def revalidated(self, key, url, stale, not_modified):
+        ''' The server answered the conditional request for stale with 304 Not Modified.
+            Caches stale again and returns it.
+        '''
+        for header in ('ETag', 'Last-Modified', 'Date', 'Expires', 'Cache-Control'):
+            if header in not_modified.headers:
+                stale.headers[header] = not_modified.headers[header]
+        with self._lock:
+            self.revalidations += 1
+        self.set(key, url, stale)
+        return stale
+
+    def set(self, key, url, response):
+        ''' Cache response if url matches a pattern and the request succeeded '''
+        ttl = self.ttl(url)
+        if ttl is None or response.status_code != 200:
+            return
+        if ttl <= 0 and not self._has_validators(response):
+            # Would never be used
+            return
+        entry = (time.time() + ttl, response)
+        self._remember(key, entry)
+        if self.path is not None:
+            self._store(key, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.path is not None:
+            for name in os.listdir(self.path):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.path, name))
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _filename(self, key):
+        return os.path.join(self.path, sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _store(self, key, entry):
+        expires, r = entry
+        data = {
+            'key': key,
+            'expires': expires,
+            'url': r.url,
+            'status_code': r.status_code,
+            'headers': dict(r.headers),
+            'encoding': r.encoding,
+            'content': b64encode(r.content).decode('ascii'),
+        }
+        from tempfile import mkstemp
+        fd, tmp_filename = mkstemp(prefix='.', suffix='.tmp', dir=self.path)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        rename_file(tmp_filename, self._filename(key))
+
+    def _load(self, key):
+        filename = self._filename(key)
+        try:
+            with open(filename, 'r') as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if data.get('key') != key:
+            return None
+        r = Response()
+        r.url = data['url']
+        r.status_code = data['status_code']
+        r.headers = CaseInsensitiveDict(data['headers'])
+        r.encoding = data['encoding']
+        r._content = b64decode(data['content'])
+        if data['expires'] <= time.time() and not self._has_validators(r):
+            self.logger.debug('Removing expired cache file "%s"', filename)
+            os.remove(filename)
+            return None
+        return (data['expires'], r)
@@ -0,0 +1,168 @@
+import os
+import json
+from threading import Lock
+from sys import version_info
+if version_info.major >= 3: # Python 3
+    from http.cookiejar import LWPCookieJar, Cookie, LoadError
+    from os import replace as rename_file
+else: # Python 2
+    from cookielib import LWPCookieJar, Cookie, LoadError
+    from os import rename as rename_file
+
+# Domain of the pseudo cookies holding oauth_access_token and steamid (see SteamWebBrowser)
+TOKEN_DOMAIN = 'steamwebbrowser.tld'
+
+_COOKIE_ATTRIBUTES = ('version', 'name', 'value', 'port', 'port_specified', 'domain', 'domain_specified',
+                      'domain_initial_dot', 'path', 'path_specified', 'secure', 'expires', 'discard',
+                      'comment', 'comment_url', 'rfc2109')
+
+def cookie_to_json(cookie):
+    data = dict((a, getattr(cookie, a)) for a in _COOKIE_ATTRIBUTES)
+    data['rest'] = cookie._rest # pylint:disable=protected-access
+    return json.dumps(data)
+
+def cookie_from_json(text):
+    return Cookie(**json.loads(text))
+
+class SessionStore(object):
+    ''' Base class for backends storing the cookies of SteamWebBrowser accounts
+        instead of one LWP file per account (see SteamWebBrowser(session_store=...)).
+
+    Every save() increases the version of the account, so browsers notice changes
+    made by other processes (see SteamCookieJar.changed_on_disk).
+    '''
+    def has_account(self, account):
+        ''' True if cookies of account are stored '''
+        raise NotImplementedError
+
+    def load(self, account):
+        ''' Returns a tuple (version, list of Cookie) '''
+        raise NotImplementedError
+
+    def save(self, account, cookies, removed):
+        ''' Store cookies and delete removed of account in one transaction.
+
+        Args:
+            account: The account.
+            cookies: Iterable of Cookie to insert or replace.
+            removed: Iterable of (domain, path, name) to delete.
+
+        Returns:
+            A tuple (old version, new version).
+        '''
+        raise NotImplementedError
+
+    def version(self, account):
+        ''' Returns the current version of account, None if it is not stored '''
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def migrate(self, account, filename):
+        ''' Import the LWP cookie file of account unless the account is stored already.
+            The file is renamed to "<filename>.migrated" afterwards.
+            Returns True if the account is stored now.
+        '''
+        if self.has_account(account):
+            return True
+        if not os.path.exists(filename):
+            return False
+        jar = LWPCookieJar(filename)
+        try:
+            jar.load(ignore_discard=True)
+        except (IOError, OSError, LoadError):
+            return False
+        self.save(account, list(jar), ())
+        rename_file(filename, filename + '.migrated')
+        return True
+
+    def migrate_directory(self, path):
+        ''' Import all LWP cookie files (named "<account>.lwp") in path, returns the migrated accounts '''
+        migrated = []
+        for name in sorted(os.listdir(path)):
+            if name.endswith('.lwp') and self.migrate(name[:-len('.lwp')], os.path.join(path, name)):
+                migrated.append(name[:-len('.lwp')])
+        return migrated
+
+class SQLiteSessionStore(SessionStore):
+    ''' Cookies of all accounts in one SQLite database, one row per cookie.
+        Saves only write the rows of changed cookies. oauth_access_token and steamid are
+        also kept in the accounts table for lookups without loading the cookies.
+
+    Usage:
+        store = SQLiteSessionStore(os.path.join(appdata_path, 'sessions.sqlite'))
+        swb = SteamWebBrowser('user', 'password', session_store=store)
+    '''
+    def __init__(self, path, timeout=30):
+        ''' Args:
+                path: Database file.
+                timeout: Optional. Seconds to wait for other processes writing the database.
+        '''
+        import sqlite3
+        self.path = path
+        self._lock = Lock()
+        self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        if path != ':memory:':
+            os.chmod(path, 0o600)
+            # Readers don't block the writer of another process
+            self._db.execute('PRAGMA journal_mode=WAL')
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS accounts ('
+                             'account TEXT PRIMARY KEY, version INTEGER NOT NULL, '
+                             'oauth_access_token TEXT, steamid TEXT)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS cookies ('
+                             'account TEXT NOT NULL, domain TEXT NOT NULL, path TEXT NOT NULL, name TEXT NOT NULL, '
+                             'data TEXT NOT NULL, PRIMARY KEY (account, domain, path, name))')
+
+    def close(self):
+        self._db.close()
+
+    def has_account(self, account):
+        return self.version(account) is not None
+
+    def version(self, account):
+        with self._lock:
+            row = self._db.execute('SELECT version FROM accounts WHERE account = ?', (account, )).fetchone()
+        return row[0] if row else None
+
+    def tokens(self, account):
+        ''' Returns a tuple (oauth_access_token, steamid), None for values not stored '''
+        with self._lock:
+            row = self._db.execute('SELECT oauth_access_token, steamid FROM accounts WHERE account = ?',
+                                   (account, )).fetchone()
+        return tuple(row) if row else (None, None)
+
+    def accounts(self):
+        with self._lock:
+            return [row[0] for row in self._db.execute('SELECT account FROM accounts ORDER BY account')]
+
+    def load(self, account):
+        with self._lock:
+            row = self._db.execute('SELECT version FROM accounts WHERE account = ?', (account, )).fetchone()
+            cookies = [cookie_from_json(data) for (data, ) in self._db.execute(
+                'SELECT data FROM cookies WHERE account = ?', (account, ))]
+        return (row[0] if row else None), cookies
+
+    def save(self, account, cookies, removed):
+        with self._lock, self._db:
+            # Take the write lock right away so the version can't change in between
+            self._db.execute('BEGIN IMMEDIATE')
+            row = self._db.execute('SELECT version FROM accounts WHERE account = ?', (account, )).fetchone()
+            old = row[0] if row else None
+            new = (old or 0) + 1
+            if row:
+                self._db.execute('UPDATE accounts SET version = ? WHERE account = ?', (new, account))
+            else:
+                self._db.execute('INSERT INTO accounts (account, version) VALUES (?, ?)', (account, new))
+            for domain, path, name in removed:
+                self._db.execute('DELETE FROM cookies WHERE account = ? AND domain = ? AND path = ? AND name = ?',
+                                 (account, domain, path, name))
+                if domain == TOKEN_DOMAIN and name in ('oauth_access_token', 'steamid'):
+                    self._db.execute('UPDATE accounts SET %s = NULL WHERE account = ?' % name, (account, ))
+            for c in cookies:
+                self._db.execute('INSERT OR REPLACE INTO cookies (account, domain, path, name, data) '
+                                 'VALUES (?, ?, ?, ?, ?)', (account, c.domain, c.path, c.name, cookie_to_json(c)))
+                if c.domain == TOKEN_DOMAIN and c.name in ('oauth_access_token', 'steamid'):
+                    self._db.execute('UPDATE accounts SET %s = ? WHERE account = ?' % c.name, (c.value, account))
+        return old, new
@@ -4,27 +4,44 @@ import re
 import os
 import stat
 import logging
+from threading import Timer, Lock, RLock
 from requests import Session
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util import Retry
-from Crypto.PublicKey import RSA
-from Crypto.Cipher import PKCS1_v1_5
-from base64 import b64encode
+from .responsecache import ResponseCache
+from .ratelimiter import RateLimitedAdapter
+from .instrumentation import RequestInfo
+from .filelock import FileLock
+from base64 import b64encode, urlsafe_b64decode
 from sys import version_info
 import json
 if version_info.major >= 3: # Python 3
-    from http.cookiejar import LWPCookieJar, Cookie
-    import configparser
+    from http.cookiejar import LWPCookieJar, Cookie, LoadError
     from weakref import finalize
+    from os import replace as rename_file
 else: # Python 2
-    from cookielib import LWPCookieJar, Cookie
-    import ConfigParser as configparser
+    from cookielib import LWPCookieJar, Cookie, LoadError
     from builtins import input, int # pylint:disable=redefined-builtin
+    from os import rename as rename_file
     def finalize(obj, func, *args, **kwargs): # pylint:disable=unused-argument
         ''' Stub method as there is no weakref.finalize in Python 2 '''
         pass
 
 DEFAULT_USERAGENT = 'Mozilla/5.0 (compatible, MSIE 11, Windows NT 6.3; Trident/7.0; rv:11.0) like Gecko'
+REDIRECT_STATUS = (301, 302, 303, 307, 308)
+
+def _jwt_expiry(value):
+    ''' Returns the exp claim of the JSON web token in a steamLoginSecure value ("<steamid>%7C%7C<token>"),
+        None if the token is no JWT.
+    '''
+    parts = value.replace('%7C', '|').split('||')[-1].split('.')
+    if len(parts) != 3:
+        return None
+    try:
+        payload = urlsafe_b64decode((parts[1] + '=' * (-len(parts[1]) % 4)).encode('ascii'))
+        return int(json.loads(payload.decode('utf-8'))['exp'])
+    except (ValueError, TypeError, KeyError, UnicodeError):
+        return None
 
 class SteamWebError(Exception):
     ''' Base class for exceptions in this module. '''
@@ -54,11 +71,382 @@ class NoTwoFactorCodeError(InputError):
     ''' Raised then no two factor code was given '''
     pass
 
+class ChallengePendingError(LoginFailedError):
+    ''' Raised by a challenge_solver to postpone the login, challenge can be solved
+        later and passed to resume_login()
+    '''
+    def __init__(self, message, challenge):
+        super(ChallengePendingError, self).__init__(message, challenge)
+        self.challenge = challenge
+
+class LoginChallenge(object):
+    ''' A challenge Steam requires to be solved before the login can continue.
+
+    Returned by SteamWebBrowser.start_login() and resume_login(). It may be solved at
+    any later time and in any thread, the login is then continued with resume_login().
+
+    Usage:
+        result = swb.start_login()
+        while isinstance(result, LoginChallenge):
+            result = swb.resume_login(result.solve(get_code_for(result)))
+    '''
+    kind = None
+    missing_code_error = InputError
+    missing_code_message = 'Code not provided.'
+
+    def __init__(self, data):
+        self.message = data.get('message', '')
+        self.code = None
+
+    def __repr__(self):
+        return '<%s message="%s">' % (self.__class__.__name__, self.message)
+
+    def solve(self, code):
+        ''' Set the code, returns the challenge '''
+        self.code = code
+        return self
+
+    @property
+    def solved(self):
+        return bool(self.code)
+
+    def login_args(self):
+        ''' Returns the keyword arguments of the next login attempt.
+            Raises InputError if no code has been given.
+        '''
+        if not self.code:
+            raise self.missing_code_error(self.missing_code_message)
+        return self._login_args()
+
+    def _login_args(self):
+        raise NotImplementedError
+
+class CaptchaChallenge(LoginChallenge):
+    ''' Captcha to solve, image is a bytestring of the PNG image '''
+    kind = 'captcha'
+    missing_code_error = NoCaptchaCodeError
+    missing_code_message = 'Captcha code not provided.'
+
+    def __init__(self, data, image=None):
+        super(CaptchaChallenge, self).__init__(data)
+        self.gid = data['captcha_gid']
+        self.image = image
+
+    def _login_args(self):
+        return {'captchagid': self.gid, 'captcha_text': self.code}
+
+class EmailChallenge(LoginChallenge):
+    ''' SteamGuard code sent to the e-mail address at maildomain '''
+    kind = 'emailauth'
+    missing_code_error = NoEmailCodeError
+    missing_code_message = 'E-mail code not provided.'
+
+    def __init__(self, data):
+        super(EmailChallenge, self).__init__(data)
+        self.maildomain = data.get('emaildomain', '')
+        self.emailsteamid = data.get('emailsteamid', '')
+
+    def _login_args(self):
+        return {'emailauth': self.code, 'emailsteamid': self.emailsteamid}
+
+class TwoFactorChallenge(LoginChallenge):
+    ''' SteamGuard code of the mobile authenticator '''
+    kind = 'twofactor'
+    missing_code_error = NoTwoFactorCodeError
+    missing_code_message = 'Two factor code not provided.'
+
+    def _login_args(self):
+        return {'twofactorcode': self.code}
+
+class _JsonArrayParser(object):
+    ''' Incremental parser for the elements of the JSON array following marker in a text
+        fed in chunks, see SteamWebBrowser.iter_json_array()
+    '''
+    def __init__(self, url, marker):
+        self.url = url
+        self.marker = marker
+        self.done = False
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._found = False # marker
+        self._started = False # opening bracket
+
+    def feed(self, chunk):
+        ''' Returns the list of elements completed by chunk '''
+        self._buf += chunk
+        if not self._started:
+            if not self._found:
+                pos = self._buf.find(self.marker)
+                if pos < 0:
+                    # Keep enough to find a marker spanning two chunks
+                    self._buf = self._buf[-len(self.marker):]
+                    return []
+                self._found = True
+                self._buf = self._buf[pos + len(self.marker):]
+            self._buf = self._buf.lstrip()
+            if not self._buf:
+                return []
+            if not self._buf.startswith('['):
+                raise SteamWebError('JSON array not found', self.url, self.marker)
+            self._buf = self._buf[1:]
+            self._started = True
+        return self._elements(False)
+
+    def close(self):
+        ''' Call at the end of the text, returns the remaining elements.
+            Raises SteamWebError if marker has not been found or the array is incomplete.
+        '''
+        if not self._started:
+            raise SteamWebError('JSON array not found', self.url, self.marker)
+        elements = self._elements(True)
+        if not self.done:
+            raise SteamWebError('Incomplete JSON array', self.url, self.marker)
+        return elements
+
+    def _elements(self, eof):
+        elements = []
+        while not self.done:
+            self._buf = self._buf.lstrip().lstrip(',').lstrip()
+            if self._buf.startswith(']'):
+                self.done = True
+                break
+            try:
+                element, end = self._decoder.raw_decode(self._buf)
+            except ValueError:
+                if eof:
+                    raise SteamWebError('Incomplete JSON array', self.url, self.marker)
+                # Element spans more than the buffer
+                break
+            if not eof and self._buf[end:].lstrip()[:1] not in (',', ']'):
+                # Only complete if followed by a separator, a number might continue in the next chunk
+                break
+            elements.append(element)
+            self._buf = self._buf[end:]
+        return elements
+
+class SteamCookieJar(LWPCookieJar):
+    ''' LWPCookieJar that keeps a generation counter which is increased on every change
+        so callers can detect changes in O(1) instead of hashing every cookie in the jar.
+        Cookies extracted from responses are counted too as extract_cookies() uses set_cookie().
+
+        The cookie file may be shared by several processes: it is written while holding a
+        FileLock on "<filename>.lock" and cookies written by another process since the last
+        load() or save() are merged, unless they have been changed in this process as well.
+
+        With the keyword arguments store (a SessionStore) and account the cookies are kept in
+        the store instead of the file, save() only writes the cookies changed since the last
+        load() or save(). filename is still used for the login lease (see SteamWebBrowser._relogin()).
+    '''
+    def __init__(self, *args, **kwargs):
+        self.generation = 0
+        self.saved_generation = 0
+        self.store = kwargs.pop('store', None)
+        self.account = kwargs.pop('account', None)
+        # (inode, mtime, size) of the file (version in the store) when it was last loaded or saved
+        self.file_stat = None
+        # (domain, path, name) of the cookies changed since the last load() or save()
+        self._dirty = set()
+        LWPCookieJar.__init__(self, *args, **kwargs)
+
+    @property
+    def changed(self):
+        ''' True if the jar has been changed since it was last loaded or saved '''
+        return self.generation != self.saved_generation
+
+    @property
+    def changed_on_disk(self):
+        ''' True if the file has been written by someone else since it was last loaded or saved '''
+        if self.store is not None:
+            return self.store.version(self.account) != self.file_stat
+        return self._stat(self.filename) != self.file_stat
+
+    @staticmethod
+    def _stat(filename):
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime, st.st_size)
+
+    def set_cookie(self, cookie):
+        with self._cookies_lock:
+            old = self._cookies.get(cookie.domain, {}).get(cookie.path, {}).get(cookie.name)
+            LWPCookieJar.set_cookie(self, cookie)
+            # Steam re-sends some cookies unchanged, don't count those
+            if old is None or repr(old) != repr(cookie):
+                self.generation += 1
+                self._dirty.add((cookie.domain, cookie.path, cookie.name))
+
+    def clear(self, domain=None, path=None, name=None):
+        with self._cookies_lock:
+            self._dirty.update((c.domain, c.path, c.name) for c in self
+                               if (domain is None or c.domain == domain) and (path is None or c.path == path)
+                               and (name is None or c.name == name))
+            LWPCookieJar.clear(self, domain, path, name)
+            self.generation += 1
+
+    def load(self, filename=None, ignore_discard=False, ignore_expires=False):
+        with self._cookies_lock:
+            if self.store is not None and filename is None:
+                version, cookies = self.store.load(self.account)
+                now = time.time()
+                for c in cookies:
+                    if (ignore_discard or not c.discard) and (ignore_expires or not c.is_expired(now)):
+                        self.set_cookie(c)
+                self.file_stat = version
+            else:
+                LWPCookieJar.load(self, filename, ignore_discard, ignore_expires)
+                self.file_stat = self._stat(filename or self.filename)
+            self.saved_generation = self.generation
+            self._dirty.clear()
+
+    def reload(self, ignore_discard=False, ignore_expires=False):
+        ''' Replace all cookies with the stored ones, e.g. after another process logged in '''
+        if self.store is not None:
+            with self._cookies_lock:
+                LWPCookieJar.clear(self)
+                self.generation += 1
+                self.load(ignore_discard=ignore_discard, ignore_expires=ignore_expires)
+            return
+        with FileLock(self.filename + '.lock'):
+            with self._cookies_lock:
+                LWPCookieJar.clear(self)
+                self.generation += 1
+                self.load(ignore_discard=ignore_discard, ignore_expires=ignore_expires)
+
+    def _merge(self, filename, ignore_discard, ignore_expires):
+        ''' Take over the cookies of filename, except those changed here since the last load() or save() '''
+        disk = LWPCookieJar(filename)
+        try:
+            disk.load(ignore_discard=ignore_discard, ignore_expires=ignore_expires)
+        except (IOError, OSError, LoadError):
+            return
+        with self._cookies_lock:
+            on_disk = set()
+            for c in disk:
+                key = (c.domain, c.path, c.name)
+                on_disk.add(key)
+                if key not in self._dirty:
+                    LWPCookieJar.set_cookie(self, c)
+            for c in list(self):
+                key = (c.domain, c.path, c.name)
+                if key not in on_disk and key not in self._dirty:
+                    # Removed by the other process
+                    LWPCookieJar.clear(self, c.domain, c.path, c.name)
+            self.generation += 1
+
+    def _save_to_store(self, ignore_discard, ignore_expires):
+        ''' Write the cookies changed since the last load() or save() to the store '''
+        with self._cookies_lock:
+            generation = self.generation
+            dirty = set(self._dirty)
+            now = time.time()
+            cookies = []
+            removed = []
+            for key in dirty:
+                c = self._cookies.get(key[0], {}).get(key[1], {}).get(key[2])
+                if c is None or (c.discard and not ignore_discard) or (c.is_expired(now) and not ignore_expires):
+                    removed.append(key)
+                else:
+                    cookies.append(c)
+        old, new = self.store.save(self.account, cookies, removed)
+        with self._cookies_lock:
+            self.saved_generation = generation
+            self._dirty -= dirty
+            if old == self.file_stat:
+                # Nobody else saved in between
+                self.file_stat = new
+
+    def save(self, filename=None, ignore_discard=False, ignore_expires=False):
+        ''' Atomically replace the cookie file by writing to a temporary file first '''
+        if self.store is not None and filename is None:
+            self._save_to_store(ignore_discard, ignore_expires)
+            return
+        from tempfile import mkstemp
+        if filename is None:
+            filename = self.filename
+        with FileLock(filename + '.lock'):
+            if filename == self.filename and self.changed_on_disk:
+                self._merge(filename, ignore_discard, ignore_expires)
+            with self._cookies_lock:
+                generation = self.generation
+                dirty = set(self._dirty)
+                data = '#LWP-Cookies-2.0\n' + self.as_lwp_str(ignore_discard, ignore_expires)
+            fd, tmp_path = mkstemp(prefix='.', suffix='.tmp',
+                                    dir=os.path.dirname(os.path.abspath(filename)))
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                rename_file(tmp_path, filename)
+            except:
+                os.remove(tmp_path)
+                raise
+            with self._cookies_lock:
+                self.saved_generation = generation
+                self._dirty -= dirty
+                if filename == self.filename:
+                    self.file_stat = self._stat(filename)
+
+    def save_if_changed(self, ignore_discard=False, ignore_expires=False):
+        if self.changed:
+            self.save(ignore_discard=ignore_discard, ignore_expires=ignore_expires)
+
 class SteamWebBrowser(object):
+    ''' A requests session logged in to Steam.
+
+    Concurrency: one instance may be used from many threads at once, e.g. with get_many() or
+    a ThreadPoolExecutor. get(), post(), login(), logged_in(), flush_cookies() and close() are
+    thread-safe: cookie changes and saves are locked, logins are serialized and if the session
+    expires only one thread logs in while the others wait and then retry their request once
+    with the new session. Configuration (set_useragent(), enable_response_cache(),
+    add_instrument(), save_interval, ...) should be done before the instance is shared.
+    For several processes sharing one account see _relogin().
+    '''
     name = 'SteamWebBrowser'
+    rsa_key_url = 'https://steamcommunity.com/mobilelogin/getrsakey/'
+    dologin_url = 'https://steamcommunity.com/mobilelogin/dologin/'
+    captcha_url = 'https://steamcommunity.com/public/captcha.php'
+    # Redirects to the own profile if logged in, to the login page otherwise
+    login_probe_url = 'https://steamcommunity.com/my/'
+    # Seconds a positive logged_in() result is cached
+    logged_in_ttl = 60
+    # Seconds to wait for the login of another process using the same cookie file
+    login_lease_timeout = 600
+    # Exchanges the oauth_access_token for new web session cookies, see refresh_session()
+    wgtoken_url = 'https://api.steampowered.com/IMobileAuthService/GetWGToken/v0001'
+    wgtoken_domains = ('steamcommunity.com', 'store.steampowered.com', 'help.steampowered.com')
+    # A session expiring again within this many seconds after refresh_session() is renewed by login()
+    token_refresh_interval = 60
+    _token_refreshed = 0
+    # Assumed seconds a web session lasts if its cookies don't tell, see session_expires()
+    session_lifetime = 86400
+    _session_started = None
+    # Seconds before expiry the session is renewed in the background, None if disabled (see enable_session_refresh())
+    session_refresh_margin = None
+    session_check_interval = 3600
+    _refresh_timer = None
+    # Stop get() and post() at a redirect to the login page instead of downloading it, see _follow_redirects()
+    early_expiry_detection = True
+    _logged_in_cache = (0, False)
     browser = None
     rsa_cipher = None
     rsa_timestamp = None
+    # Seconds a RSA key is reused for logins of the same user (shared by all instances)
+    rsa_key_ttl = 300
+    _rsa_keys = {}
+    _rsa_keys_lock = Lock()
+    # Guards the lazily initialized _appdata_path
+    _init_lock = Lock()
+    _encrypted_password = None
+    # Optional ResponseCache for get(), see enable_response_cache()
+    response_cache = None
+    # Instruments called for every get() and post(), see add_instrument()
+    instruments = ()
+    # Optional callable(LoginChallenge) returning the code, used by login() instead of the _handle_* methods.
+    # It may raise ChallengePendingError to abort the login (and a relogin in get() or post()) instead.
+    challenge_solver = None
     re_nonascii = re.compile(r'[^\x00-\x7F]')
     re_fs_safe = re.compile(r'[^\w-]')
     mobile_cookies = (
@@ -76,40 +464,92 @@ class SteamWebBrowser(object):
         ),
     )
 
-    def __init__(self, username=None, password=None):
+    def __init__(self, username=None, password=None, save_interval=0, adapter=None,
+                session_store=None): # pylint:disable=too-many-arguments
+        ''' Args:
+                username: Steam username.
+                password: Steam password.
+                save_interval: Optional. Write changed cookies to disk at most once every
+                    save_interval seconds instead of after every change. Pending changes are
+                    written by flush_cookies(), close() and when the object is garbage collected.
+                adapter: Optional. A HTTPAdapter (see make_adapter()) to share its connection pool
+                    with other instances. It is not closed by this instance.
+                session_store: Optional. A SessionStore (e.g. SQLiteSessionStore) to keep the cookies
+                    in instead of a LWP file. An existing LWP file of the account is migrated.
+        '''
         self._username = self._remove_nonascii(username)
         self._password = self._remove_nonascii(password)
         self.logger.info('Initialized with user: %s', self._username)
+        self.save_interval = save_interval
+        self._save_timer = None
+        self._last_save = 0
+        self._save_lock = RLock()
+        # Reentrant as login() is recursive and is called by _relogin()
+        self._login_lock = RLock()
+        self._login_count = 0
+        self._refresh_lock = Lock()
 
         self.session = Session()
-        # urllib3 will sleep for {backoff factor} * (2 ^ ({number of total retries} - 1)) seconds between attempts.
-        self.session.mount('http://', HTTPAdapter(
-            max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
-        ))
-        self.session.mount('https://', HTTPAdapter(
-            max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
-        ))
+        self._shared_adapter = adapter is not None
+        if adapter is None:
+            adapter = self.make_adapter()
+            # Avoid ResourceWarning: unclosed <ssl.SSLSocket ...> with python 3
+            finalize(self, self.session.close)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.set_useragent()
-        # Avoid ResourceWarning: unclosed <ssl.SSLSocket ...> with python 3
-        finalize(self, self.session.close)
 
-        cookie_file = os.path.join(self.appdata_path, self._make_fs_safe(username)+'.lwp')
-        self.session.cookies = LWPCookieJar(cookie_file)
-        if not os.path.exists(cookie_file):
+        account = self._make_fs_safe(username)
+        cookie_file = os.path.join(self.appdata_path, account+'.lwp')
+        if session_store is not None:
+            self.session.cookies = SteamCookieJar(cookie_file, store=session_store, account=account)
+            exists = session_store.migrate(account, cookie_file)
+        else:
+            self.session.cookies = SteamCookieJar(cookie_file)
+            exists = os.path.exists(cookie_file)
+        # Write pending cookie changes on garbage collection
+        finalize(self, self.session.cookies.save_if_changed, ignore_discard=True)
+        if not exists:
             # initialize new cookie file
-            self.logger.info('Creating new cookie file: "%s"', cookie_file)
+            self.logger.info('Creating new cookies for "%s"', account)
             self.set_mobile_cookies()
             self._save_cookies()
-            os.chmod(cookie_file,  stat.S_IRUSR | stat.S_IWUSR)
+            if session_store is None:
+                os.chmod(cookie_file,  stat.S_IRUSR | stat.S_IWUSR)
         else:
             # load cookies
-            self.logger.info('Loading cookies from file: "%s"', cookie_file)
+            self.logger.info('Loading cookies of "%s"', account)
             self.session.cookies.load(ignore_discard=True)
             if not self._has_cookie('forceMobile') or not self._has_cookie('mobileClient'):
                 self.clear_mobile_cookies()
                 self.set_mobile_cookies()
                 self._save_cookies()
 
+    @staticmethod
+    def make_adapter(pool_connections=10, pool_maxsize=10, rate_limiter=None):
+        ''' Returns a HTTPAdapter with the default retry settings.
+
+        Args:
+            pool_connections: Optional. Number of connection pools (hosts) to cache.
+            pool_maxsize: Optional. Maximum number of connections to keep per pool.
+            rate_limiter: Optional. A RateLimiter pacing the requests per host. Throttled
+                requests (429, 503) are then retried by the RateLimiter instead of urllib3.
+        '''
+        # urllib3 will sleep for {backoff factor} * (2 ^ ({number of total retries} - 1)) seconds between attempts.
+        if rate_limiter is not None:
+            return RateLimitedAdapter(
+                rate_limiter,
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+                max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[500, 502, 504]),
+            )
+        # 429 and 503 honor the Retry-After header
+        return HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+        )
+
     @property
     def oauth_access_token(self):
         c = self._get_cookie('oauth_access_token', 'steamwebbrowser.tld')
@@ -132,26 +572,58 @@ class SteamWebBrowser(object):
         return self._logger
 
     def _save_cookies(self):
-        self.logger.debug('Saving cookies to disk')
-        return self.session.cookies.save(ignore_discard=True)
+        with self._save_lock:
+            if self.save_interval:
+                delay = self._last_save + self.save_interval - time.time()
+                if delay > 0:
+                    # Coalesce with other changes and write them later
+                    if self._save_timer is None:
+                        self.logger.debug('Delaying cookie save for %.1f seconds', delay)
+                        self._save_timer = Timer(delay, self.flush_cookies)
+                        self._save_timer.daemon = True
+                        self._save_timer.start()
+                    return
+            self.flush_cookies()
+
+    def flush_cookies(self):
+        ''' Write cookies to disk now if they have changed since the last save '''
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            self._last_save = time.time()
+            if self.session.cookies.changed:
+                self.logger.debug('Saving cookies to disk')
+                self.session.cookies.save(ignore_discard=True)
+
+    def close(self):
+        ''' Write pending cookie changes, stop the background session refresh and close the underlying session '''
+        self.session_refresh_margin = None
+        self._cancel_session_refresh()
+        self.flush_cookies()
+        if not self._shared_adapter:
+            self.session.close()
 
     @property
     def appdata_path(self):
         if not getattr(self, '_appdata_path', False):
-            # Determine and create path if not exist
-            if 'STEAMWEBROWSER_HOME' in os.environ:
-                confighome = os.environ['STEAMWEBROWSER_HOME']
-            elif 'APPDATA' in os.environ:
-                confighome = os.environ['APPDATA']
-            elif 'XDG_CONFIG_HOME' in os.environ:
-                confighome = os.environ['XDG_CONFIG_HOME']
-            else:
-                confighome = os.path.join(os.environ['HOME'], '.config')
-            # Store it for later reference and create it if it does not exist
-            self._appdata_path = os.path.join(confighome, self.name)
-            for p in (confighome, self._appdata_path):
-                if not os.path.isdir(p):
-                    os.mkdir(p, stat.S_IRWXU)
+            with self._init_lock:
+                if not getattr(self, '_appdata_path', False):
+                    # Determine and create path if not exist
+                    if 'STEAMWEBROWSER_HOME' in os.environ:
+                        confighome = os.environ['STEAMWEBROWSER_HOME']
+                    elif 'APPDATA' in os.environ:
+                        confighome = os.environ['APPDATA']
+                    elif 'XDG_CONFIG_HOME' in os.environ:
+                        confighome = os.environ['XDG_CONFIG_HOME']
+                    else:
+                        confighome = os.path.join(os.environ['HOME'], '.config')
+                    appdata_path = os.path.join(confighome, self.name)
+                    for p in (confighome, appdata_path):
+                        if not os.path.isdir(p):
+                            os.mkdir(p, stat.S_IRWXU)
+                    # Store it for later reference once it exists
+                    self._appdata_path = appdata_path
         self.logger.info('Appdata path: "%s"', self._appdata_path)
         return self._appdata_path
 
@@ -171,43 +643,377 @@ class SteamWebBrowser(object):
         for mc in self.mobile_cookies:
             self.session.cookies.set_cookie(mc)
 
-    def post(self, url, data=None, **kwargs):
-        self.logger.debug('POST "%s", data: "%s", kwargs: "%s"', url, data, kwargs)
-        h = self._hash_cookies()
-        r = self.session.post(url, data, **kwargs)
+    def add_instrument(self, instrument):
+        ''' Call the hooks of instrument (see steamweb.instrumentation.Instrument) for every get() and post() '''
+        self.instruments = list(self.instruments) + [instrument]
+
+    def _start_request(self, method, url):
+        info = RequestInfo(method, url)
+        for instrument in self.instruments:
+            instrument.before_request(info)
+        return info
+
+    def _finish_request(self, info):
+        info.finish()
+        for instrument in self.instruments:
+            instrument.after_request(info)
+
+    def _instrumented_request(self, info, send, url, *args, **kwargs):
+        ''' Send a request with send (session.get or session.post), raise on HTTP errors and save changed cookies '''
+        g = self.session.cookies.generation
+        start = time.time()
+        if self.early_expiry_detection and kwargs.get('allow_redirects', True):
+            r = self._follow_redirects(send, url, *args, **kwargs)
+        else:
+            r = send(url, *args, **kwargs)
+        info.response(r, start, stream=kwargs.get('stream', False))
         # Will raise HTTPError on 4XX client error or 5XX server error response
         r.raise_for_status()
-        if h != self._hash_cookies():
+        if g != self.session.cookies.generation:
             # Cookies have changed
+            start = time.time()
             self._save_cookies()
-        if r.history and 'login/home/?goto=' in r.url:
+            info.timed('save_cookies', start)
+            info.cookies_saved = True
+        return r
+
+    def _follow_redirects(self, send, url, *args, **kwargs):
+        ''' Send a request with send and follow its redirects, stopping at a redirect
+            to the login page (see _session_expired()) before it is fetched.
+        '''
+        kwargs['allow_redirects'] = False
+        r = send(url, *args, **kwargs)
+        if not self._session_expired(r):
+            # Same settings as Session.send() would pass, the generator only sends the next hop when asked
+            settings = self.session.merge_environment_settings(r.request.url, kwargs.get('proxies') or {},
+                kwargs.get('stream'), kwargs.get('verify'), kwargs.get('cert'))
+            history = [r]
+            for r in self.session.resolve_redirects(r, r.request, timeout=kwargs.get('timeout'), **settings):
+                history.append(r)
+                if self._session_expired(r):
+                    break
+            r = history.pop()
+            r.history = history
+        return r
+
+    def _relogin_expired(self, info, logins):
+        ''' Login again after the session expired, returns True on success '''
+        self._logged_in_cache = (0, False)
+        self.logger.warning('Session expired while %s, trying to login again', info.method)
+        info.relogin = True
+        start = time.time()
+        try:
+            return self._relogin(logins)
+        finally:
+            info.timed('relogin', start)
+
+    def post(self, url, data=None, **kwargs):
+        self.logger.debug('POST "%s", data: "%s", kwargs: "%s"', url, data, kwargs)
+        info = self._start_request('POST', url)
+        try:
+            return self._post(info, url, data, True, **kwargs)
+        except Exception as e:
+            info.error = e
+            raise
+        finally:
+            self._finish_request(info)
+
+    def _post(self, info, url, data, relogin, **kwargs):
+        logins = self._login_count
+        r = self._instrumented_request(info, self.session.post, url, data, **kwargs)
+        if self._session_expired(r):
+            if not relogin:
+                self.logger.error('Session expired again after login during POST')
             # Session expired, login again
-            self.logger.warning('Session expired while POST, trying to login again')
-            if self.login():
-                return self.post(url, data, **kwargs)
+            elif self._relogin_expired(info, logins):
+                # Retry once with the new session
+                return self._post(info, url, data, False, **kwargs)
             else:
                 self.logger.error('Login failed during POST')
         else:
             return r
 
-    def get(self, url, **kwargs):
+    def get(self, url, force_refresh=False, **kwargs):
+        ''' GET url, answered from response_cache if enabled.
+        Expired responses with an ETag or Last-Modified header are revalidated with a conditional request.
+
+        Args:
+            url: The URL.
+            force_refresh: Optional. Bypass the response cache (the new response is cached).
+            kwargs: Passed to requests.Session.get().
+        '''
         self.logger.debug('GET "%s", kwargs: "%s"', url, kwargs)
-        h = self._hash_cookies()
-        r = self.session.get(url, **kwargs)
-        # Will raise HTTPError on 4XX client error or 5XX server error response
-        r.raise_for_status()
-        if h != self._hash_cookies():
-            # Cookies have changed
-            self._save_cookies()
-        if r.history and 'login/home/?goto=' in r.url:
+        info = self._start_request('GET', url)
+        try:
+            return self._get(info, url, force_refresh, True, **kwargs)
+        except Exception as e:
+            info.error = e
+            raise
+        finally:
+            self._finish_request(info)
+
+    def _cache_lookup(self, info, url, force_refresh, kwargs):
+        ''' Looks up a GET of url in response_cache.
+            Returns a tuple (response, cache_key, stale, request_kwargs): response is the cached
+            response or None, stale an expired response to revalidate with request_kwargs.
+        '''
+        cache_key = None
+        stale = None
+        request_kwargs = kwargs
+        if self.response_cache is not None and not kwargs.get('stream'):
+            cache_key = self.response_cache.key(self._username.decode('ascii'), url, kwargs.get('params'))
+            if not force_refresh:
+                r, stale = self.response_cache.lookup(cache_key, url)
+                if r is not None:
+                    self.logger.debug('GET "%s" answered from cache', url)
+                    info.cached = True
+                    info.status_code = r.status_code
+                    return r, cache_key, None, kwargs
+            if stale is not None:
+                # Ask the server if the cached response is still valid
+                request_kwargs = dict(kwargs)
+                request_kwargs['headers'] = dict(kwargs.get('headers') or {})
+                request_kwargs['headers'].update(self.response_cache.conditional_headers(stale))
+        return None, cache_key, stale, request_kwargs
+
+    def _cache_response(self, url, cache_key, stale, r):
+        ''' Stores the response r of a GET in response_cache, returns the response for the caller '''
+        if stale is not None and r.status_code == 304:
+            self.logger.debug('GET "%s" not modified, answered from cache', url)
+            return self.response_cache.revalidated(cache_key, url, stale, r)
+        if cache_key is not None:
+            self.response_cache.set(cache_key, url, r)
+        return r
+
+    def _get(self, info, url, force_refresh, relogin, **kwargs):
+        r, cache_key, stale, request_kwargs = self._cache_lookup(info, url, force_refresh, kwargs)
+        if r is not None:
+            return r
+        logins = self._login_count
+        r = self._instrumented_request(info, self.session.get, url, **request_kwargs)
+        if self._session_expired(r):
+            if not relogin:
+                self.logger.error('Session expired again after login during GET')
             # Session expired, login again
-            self.logger.warning('Session expired while GET, trying to login again')
-            if self.login():
-                return self.get(url, **kwargs)
+            elif self._relogin_expired(info, logins):
+                # Retry once with the new session
+                return self._get(info, url, force_refresh, False, **kwargs)
             else:
                 self.logger.error('Login failed during GET')
         else:
-            return r
+            return self._cache_response(url, cache_key, stale, r)
+
+    def enable_response_cache(self, ttls, maxsize=256, persist=False):
+        ''' Cache responses of get() for URLs matching ttls.
+            To share a cache between instances, assign the same ResponseCache to response_cache.
+
+        Args:
+            ttls: Iterable of (regex, seconds) tuples, see ResponseCache.
+            maxsize: Optional. Maximum number of responses kept in memory.
+            persist: Optional. Also store responses in appdata_path/cache.
+
+        Returns:
+            The ResponseCache.
+        '''
+        path = os.path.join(self.appdata_path, 'cache') if persist else None
+        self.response_cache = ResponseCache(ttls, maxsize=maxsize, path=path)
+        return self.response_cache
+
+    def enable_session_refresh(self, margin=600, check_interval=3600):
+        ''' Renew the session in the background before it expires, so get() and post() don't find
+            it expired and have to wait for a login and send their request again.
+            Call close() to stop it.
+
+        Args:
+            margin: Optional. Seconds before session_expires() the session is renewed.
+            check_interval: Optional. Seconds between checks with logged_in() if the expiry is unknown.
+        '''
+        self.session_refresh_margin = margin
+        self.session_check_interval = check_interval
+        self._schedule_session_refresh()
+
+    def session_expires(self):
+        ''' Returns the estimated time (seconds since the epoch) the web session expires, None if unknown.
+            Taken from the steamLoginSecure cookies (their expiry or that of their token), else
+            session_lifetime seconds after the last login of this instance.
+        '''
+        expires = []
+        for c in self.session.cookies:
+            if c.name == 'steamLoginSecure':
+                exp = c.expires or _jwt_expiry(c.value)
+                if exp:
+                    expires.append(exp)
+        if expires:
+            return max(expires)
+        if self._session_started is not None:
+            return self._session_started + self.session_lifetime
+        return None
+
+    def _session_refresh_delay(self):
+        expires = self.session_expires()
+        if expires is None:
+            return self.session_check_interval
+        # Don't check more often than a refresh with the oauth_access_token is allowed
+        return max(expires - self.session_refresh_margin - time.time(), self.token_refresh_interval)
+
+    def _session_refresh_due(self):
+        ''' True if the session has to be renewed now, None if the expiry is unknown '''
+        expires = self.session_expires()
+        if expires is None:
+            return None
+        return expires - self.session_refresh_margin <= time.time()
+
+    def _cancel_session_refresh(self):
+        with self._refresh_lock:
+            if self._refresh_timer is not None:
+                self._refresh_timer.cancel()
+                self._refresh_timer = None
+
+    def _schedule_session_refresh(self, delay=None):
+        ''' (Re)start the timer of the background session refresh, if enabled '''
+        if self.session_refresh_margin is None:
+            return
+        if delay is None:
+            delay = self._session_refresh_delay()
+        with self._refresh_lock:
+            if self._refresh_timer is not None:
+                self._refresh_timer.cancel()
+            self.logger.debug('Next session refresh check in %.0f seconds', delay)
+            self._refresh_timer = Timer(delay, self._refresh_session_ahead)
+            self._refresh_timer.daemon = True
+            self._refresh_timer.start()
+
+    def _refresh_session_ahead(self):
+        delay = None
+        try:
+            due = self._session_refresh_due()
+            if due is None:
+                due = not self.logged_in()
+            if due:
+                self.logger.info('Session expires soon, renewing it')
+                if not self._relogin(self._login_count, background=True):
+                    self.logger.warning('Renewing the session failed')
+                    delay = self.session_check_interval
+                elif self._session_refresh_due():
+                    # The expiry did not move, don't renew again right away
+                    delay = self.session_check_interval
+        except Exception: # pylint:disable=broad-except
+            self.logger.exception('Renewing the session failed')
+            delay = self.session_check_interval
+        self._schedule_session_refresh(delay)
+
+    def get_many(self, urls, max_workers=8, ordered=True, **kwargs):
+        ''' Fetch urls with get() in parallel threads sharing this session.
+        If the session expired, the requests noticing it wait for a single login and retry.
+
+        Args:
+            urls: Iterable of URLs.
+            max_workers: Optional. Number of threads. Should not exceed the pool_maxsize of the
+                adapter (see make_adapter()) or connections will not be reused.
+            ordered: Optional. Yield in order of urls if True, else as the requests complete.
+            kwargs: Passed to get() for every URL.
+
+        Returns:
+            A generator of (url, response) tuples. Exceptions raised by get() (for example HTTPError)
+            are raised when the respective tuple would have been yielded.
+        '''
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        urls = list(urls)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self.get, url, **kwargs) for url in urls]
+            future_urls = dict(zip(futures, urls))
+            for f in (futures if ordered else as_completed(futures)):
+                yield future_urls[f], f.result()
+
+    def iter_json_array(self, url, marker, chunk_size=16384, **kwargs):
+        ''' Stream the page at url and yield the elements of the JSON array following marker.
+        Only as much of the page as needed is downloaded and never more than one element is
+        kept in memory, e.g. iter_json_array(games_url, 'var rgGames = ') for the games page.
+
+        Args:
+            url: The URL.
+            marker: The text directly preceding the JSON array (whitespace between is allowed).
+            chunk_size: Optional. Size of the chunks to read.
+            kwargs: Passed to get().
+
+        Raises:
+            SteamWebError if marker is not found or the array is incomplete.
+        '''
+        parser = _JsonArrayParser(url, marker)
+        r = self.get(url, stream=True, **kwargs)
+        try:
+            if not r.encoding:
+                r.encoding = 'utf-8'
+            for chunk in r.iter_content(chunk_size=chunk_size, decode_unicode=True):
+                for element in parser.feed(chunk):
+                    yield element
+                if parser.done:
+                    return
+            for element in parser.close():
+                yield element
+        finally:
+            # Don't download the rest of the page
+            r.close()
+
+    def _relogin(self, logins, background=False):
+        ''' Login again unless another thread or process did so since the expired request was sent.
+        Processes sharing the cookie file take turns on a lease ("<cookie file>.login" lock):
+        the first one logs in, the others wait and then load the new cookies.
+
+        Args:
+            logins: Value of _login_count before the expired request was sent.
+            background: Optional. Only login with the password if challenge_solver is set, the
+                challenge handlers would block with a prompt nobody sees.
+        '''
+        with self._login_lock:
+            if self._login_count != logins:
+                self.logger.debug('Session has been renewed by another thread')
+                return True
+            lease = FileLock(self.session.cookies.filename + '.login')
+            if not lease.acquire(self.login_lease_timeout):
+                raise LoginFailedError('Timeout waiting for the login of another process')
+            try:
+                if self._reload_renewed_session():
+                    self.logger.info('Session has been renewed by another process')
+                    self._login_count += 1
+                    self._session_started = time.time()
+                    self._logged_in_cache = (0, False)
+                    return True
+                steamid = self.refresh_session()
+                if steamid or not self._may_login(background):
+                    return steamid
+                return self.login()
+            finally:
+                lease.release()
+
+    def _may_login(self, background):
+        if background and self.challenge_solver is None:
+            self.logger.warning('Session can not be renewed without a login, leaving it to the next request')
+            return False
+        return True
+
+    def _login_cookie_values(self):
+        return sorted(c.value for c in self.session.cookies if c.name == 'steamLoginSecure')
+
+    def _reload_renewed_session(self):
+        ''' Load the cookie file if another process has written it.
+            Returns True if it contains a new login.
+        '''
+        cookies = self.session.cookies
+        if not cookies.changed_on_disk:
+            return False
+        before = self._login_cookie_values()
+        # Write own changes first, they are merged with those of the other process
+        self.flush_cookies()
+        cookies.reload(ignore_discard=True)
+        return self._login_cookie_values() != before and self._may_be_logged_in()
+
+    @staticmethod
+    def _session_expired(r):
+        ''' True if the request has been redirected (or is about to be redirected) to the login page '''
+        if r.status_code in REDIRECT_STATUS:
+            return 'login/home/?goto=' in r.headers.get('Location', '')
+        return bool(r.history) and 'login/home/?goto=' in r.url
 
     def get_account_page(self):
         return self.get('https://store.steampowered.com/account/')
@@ -257,48 +1063,110 @@ class SteamWebBrowser(object):
             return True
         return False
 
-    def _hash_cookies(self):
-        ''' Returns the hash of a list of hashes from sorted repr() of every cookie in jar as
-            LWPCookieJar does not change it's hash when cookies change.
-        '''
-        return hash(frozenset([hash(c) for c in sorted([repr(c) for c in self.session.cookies])]))
-
     def _get_rsa_key(self):
         ''' get steam RSA key, build and return cipher '''
-        url = 'https://steamcommunity.com/mobilelogin/getrsakey/'
-        values = {
+        req = self.post(self.rsa_key_url, data=self._rsa_key_values())
+        self._set_rsa_key(req.json())
+
+    def _rsa_key_values(self):
+        return {
                 'username': self._username,
                 'donotcache' : self._get_donotcachetime(),
         }
-        req = self.post(url, data=values)
-        data = req.json()
+
+    def _set_rsa_key(self, data):
+        ''' Build the RSA cipher from a getrsakey response and cache it for other logins of this user '''
         if not data['success']:
             raise SteamWebError('Failed to get RSA key', data)
-        # Construct RSA and cipher
-        mod = int(str(data['publickey_mod']), 16)
-        exp = int(str(data['publickey_exp']), 16)
-        rsa = RSA.construct((mod, exp))
-        self.rsa_cipher = PKCS1_v1_5.new(rsa)
+        key = (data['publickey_mod'], data['publickey_exp'])
+        with self._rsa_keys_lock:
+            cached = self._rsa_keys.get(self._username)
+        if cached and cached['key'] == key:
+            cipher = cached['cipher']
+        else:
+            # Construct RSA and cipher
+            mod = int(str(data['publickey_mod']), 16)
+            exp = int(str(data['publickey_exp']), 16)
+            # pycrypto is only needed for logins, don't load it on import
+            from Crypto.PublicKey import RSA
+            from Crypto.Cipher import PKCS1_v1_5
+            rsa = RSA.construct((mod, exp))
+            cipher = PKCS1_v1_5.new(rsa)
+        with self._rsa_keys_lock:
+            self._rsa_keys[self._username] = {
+                'key': key,
+                'cipher': cipher,
+                'timestamp': data['timestamp'],
+                'fetched': time.time(),
+            }
+        self.rsa_cipher = cipher
         self.rsa_timestamp = data['timestamp']
 
+    def _use_cached_rsa_key(self):
+        ''' Use the cached RSA key of this user if it is younger than rsa_key_ttl.
+            Returns True if it was used.
+        '''
+        with self._rsa_keys_lock:
+            cached = self._rsa_keys.get(self._username)
+        if cached is None or time.time() - cached['fetched'] >= self.rsa_key_ttl:
+            return False
+        self.rsa_cipher = cached['cipher']
+        self.rsa_timestamp = cached['timestamp']
+        return True
+
+    def _forget_rsa_key(self):
+        with self._rsa_keys_lock:
+            self._rsa_keys.pop(self._username, None)
+        self.rsa_cipher = None
+        self.rsa_timestamp = None
+
     def _get_encrypted_password(self):
         if not self.rsa_cipher:
             self._get_rsa_key()
-        # str.encode('base64') returns a formatted string (including newlines) so use b64encode instead
-        return b64encode(self.rsa_cipher.encrypt(self._password))
+        # Encrypt only once per cipher
+        if self._encrypted_password is None or self._encrypted_password[0] is not self.rsa_cipher:
+            # str.encode('base64') returns a formatted string (including newlines) so use b64encode instead
+            self._encrypted_password = (self.rsa_cipher, b64encode(self.rsa_cipher.encrypt(self._password)))
+        return self._encrypted_password[1]
 
     def logged_in(self):
+        ''' Check if the session is logged in.
+            Locally known state (access token, login cookie) is checked first. Otherwise a request
+            to https://steamcommunity.com/my/ is made, which redirects to the login page
+            if not logged in. A positive result is cached for logged_in_ttl seconds.
+        '''
+        if not self._may_be_logged_in():
+            return False
+        checked, result = self._logged_in_cache
+        if result and time.time() - checked < self.logged_in_ttl:
+            return True
+        # Use session directly as self.get() will trigger login if not logged in.
+        # Don't follow the redirect and don't download the body.
+        r = self.session.get(self.login_probe_url, allow_redirects=False, stream=True)
+        r.close()
+        self.logger.debug('Response headers: %s', r.headers)
+        result = self._probe_logged_in(r.status_code, r.headers.get('Location', ''))
+        self._logged_in_cache = (time.time(), result)
+        return result
+
+    def _may_be_logged_in(self):
+        ''' Returns False if locally known state says that the session is not logged in '''
         try:
             getattr(self, 'oauth_access_token')
         except AttributeError:
             self.logger.debug('No access token stored')
             return False
-        # Use session directly as self.get() will trigger login if not logged in
-        r = self.session.get(self.profile_url)
-        self.logger.debug('Request headers: %s', r.headers)
-        if '<a class="global_action_link"' not in r.text:
-            return True
-        return False
+        login_cookies = [c for c in self.session.cookies
+                        if c.name == 'steamLoginSecure' and c.domain.endswith('steamcommunity.com')]
+        if not login_cookies or all(c.is_expired() for c in login_cookies):
+            self.logger.debug('No valid steamLoginSecure cookie')
+            return False
+        return True
+
+    @staticmethod
+    def _probe_logged_in(status_code, location):
+        ''' Interpret the response to login_probe_url '''
+        return status_code in (301, 302, 303, 307, 308) and 'login/home' not in location
 
     @staticmethod
     def _handle_captcha(captcha_data, message=''): # pylint:disable=unused-argument
@@ -380,19 +1248,129 @@ class SteamWebBrowser(object):
         self.session.cookies.set_cookie(c)
         self._save_cookies()
 
+    def refresh_session(self):
+        ''' Renew the web session (steamLogin and steamLoginSecure cookies) with the stored
+            oauth_access_token and steamid in a single request instead of a login.
+            Returns the steamid, None if there is no token or Steam rejected it.
+        '''
+        values = self._token_refresh_values()
+        if values is None:
+            return None
+        r = self.session.post(self.wgtoken_url, data=values)
+        return self._token_refresh_result(r.status_code, r.text)
+
+    def _token_refresh_values(self):
+        ''' Returns the form values for a wgtoken_url request or None if no refresh should be tried '''
+        try:
+            token = self.oauth_access_token
+            getattr(self, 'steamid')
+        except AttributeError:
+            self.logger.debug('No oauth_access_token or steamid stored, unable to refresh the session')
+            return None
+        if time.time() - self._token_refreshed < self.token_refresh_interval:
+            self.logger.info('Session expired right after it was refreshed with the oauth_access_token')
+            return None
+        return {'access_token': token}
+
+    def _token_refresh_result(self, status_code, text):
+        ''' Processes a wgtoken_url response. Returns the steamid if the session has been renewed. '''
+        try:
+            data = json.loads(text).get('response', {}) if status_code == 200 else {}
+        except ValueError:
+            data = {}
+        if not data.get('token') or not data.get('token_secure'):
+            self.logger.warning('oauth_access_token has been rejected (status %d)', status_code)
+            return None
+        steamid = self.steamid
+        for domain in self.wgtoken_domains:
+            for name, token, secure in (('steamLogin', data['token'], False),
+                                        ('steamLoginSecure', data['token_secure'], True)):
+                self.session.cookies.set_cookie(Cookie(version=0, name=name, value='%s%%7C%%7C%s' % (steamid, token),
+                    port=None, port_specified=False,
+                    domain=domain, domain_specified=True, domain_initial_dot=False,
+                    path='/', path_specified=True,
+                    secure=secure, expires=None, discard=False, comment=None, comment_url=None, rest={},
+                ))
+        self._save_cookies()
+        self._token_refreshed = self._session_started = time.time()
+        self._login_count += 1
+        self._logged_in_cache = (time.time(), True)
+        self.logger.info('Session refreshed with the oauth_access_token, steamid: "%s"', steamid)
+        return steamid
+
     def login(self, captchagid='-1', captcha_text='', emailauth='', emailsteamid='',
                 loginfriendlyname='', twofactorcode=''): # pylint:disable=too-many-arguments
+        ''' Login to Steam, challenges are solved by challenge_solver or the challenge handlers
+            (_handle_captcha(), ...) which block until a code is given.
+            Returns the steamid. Logins of threads sharing this instance are serialized.
+            See start_login() for a login that does not wait for challenges to be solved.
+        '''
+        with self._login_lock:
+            return self._login(captchagid, captcha_text, emailauth, emailsteamid, loginfriendlyname, twofactorcode)
+
+    def _login(self, *args):
+        result = self._login_step(*args)
+        while isinstance(result, LoginChallenge):
+            result = self._login_step(**self._solve_login_challenge(result))
+        return result
+
+    def start_login(self):
+        ''' Login without waiting for challenges.
+            Returns the steamid or a LoginChallenge which has to be solved and passed to resume_login().
+        '''
+        with self._login_lock:
+            return self._login_step()
+
+    def resume_login(self, challenge):
+        ''' Continue a login with a solved LoginChallenge.
+            Returns the steamid or the next LoginChallenge.
+            Raises InputError if the challenge has not been solved.
+        '''
+        with self._login_lock:
+            return self._login_step(**challenge.login_args())
+
+    def _login_step(self, captchagid='-1', captcha_text='', emailauth='', emailsteamid='',
+                loginfriendlyname='', twofactorcode=''): # pylint:disable=too-many-arguments
+        ''' One dologin request, returns the steamid or a LoginChallenge '''
         self.logger.info('login called with: captchagid="%s", captcha_text="%s", emailauth="%s",'
                         ' emailsteamid="%s", loginfriendlyname="%s", twofactorcode="%s"',
                         captchagid, captcha_text, emailauth, emailsteamid, loginfriendlyname,
                         twofactorcode,
         )
-        # Force a new RSA key request for every call
-        self._get_rsa_key()
+        cached_key = self._use_cached_rsa_key()
+        if not cached_key:
+            self._get_rsa_key()
 
         # Login
-        url = 'https://steamcommunity.com/mobilelogin/dologin/'
-        values = {
+        login_args = dict(captchagid=captchagid, captcha_text=captcha_text,
+                        emailauth=emailauth, emailsteamid=emailsteamid,
+                        loginfriendlyname=loginfriendlyname, twofactorcode=twofactorcode)
+        req = self.post(self.dologin_url, data=self._login_values(**login_args))
+        self.logger.debug('login response: "%s"', req.text)
+        data = req.json()
+        steamid = self._login_result(data)
+        if steamid:
+            # Logged in
+            return steamid
+
+        try:
+            challenge = self._login_challenge(data)
+        except LoginFailedError:
+            if not cached_key:
+                raise
+            # Steam may have rejected the timestamp of the cached RSA key
+            self.logger.info('Login failed with cached RSA key, retrying with a new one')
+            self._forget_rsa_key()
+            return self._login_step(**login_args)
+        if challenge.kind == 'captcha':
+            challenge.image = self.get(self.captcha_url, params={'gid': challenge.gid}).content
+        self.logger.info('Login requires a %s code', challenge.kind)
+        return challenge
+
+    def _login_values(self, captchagid='-1', captcha_text='', emailauth='', emailsteamid='',
+                loginfriendlyname='', twofactorcode=''): # pylint:disable=too-many-arguments
+        ''' Returns the form values for a dologin request '''
+        return {
                 'username': self._username,
                 'password': self._get_encrypted_password(),
                 'emailauth': emailauth, # SteamGuard email code
@@ -407,9 +1385,11 @@ class SteamWebBrowser(object):
                 'oauth_client_id': 'DE45CD61',
         }
 
-        req = self.post(url, data=values)
-        self.logger.debug('login response: "%s"', req.text)
-        data = req.json()
+    def _login_result(self, data):
+        ''' Processes a dologin response.
+            Returns the steamid if the login is complete, None if a challenge has to be solved.
+            Raises IncorrectLoginError if the credentials are wrong.
+        '''
         print(data)
         self.logger.debug('JSON login response: "%s"', data)
         if data.get('message'):
@@ -432,40 +1412,51 @@ class SteamWebBrowser(object):
             self.logger.debug('JSON Oauth: "%s"', oauth_json)
             self._store_oauth_access_token(oauth_json['oauth_token'])
             self._store_steamid(oauth_json['steamid'])
+            self._login_count += 1
+            self._session_started = time.time()
+            self._logged_in_cache = (time.time(), True)
             self.logger.info('Login completed, steamid: "%s"', self.steamid)
-            # Logged in
             return self.steamid
+        return None
 
-        elif data.get('captcha_needed') == True and data.get('captcha_gid', '-1') != '-1':
-            imgdata = self.get('https://steamcommunity.com/public/captcha.php',
-                                        params={'gid': data['captcha_gid']})
-            captcha_text = self._handle_captcha(captcha_data=imgdata.content, message=data.get('message', ''))
-            self.logger.info('Got captcha text "%s"', captcha_text)
-            if not captcha_text:
-                raise NoCaptchaCodeError('Captcha code not provided.')
-            return self.login(captchagid=data['captcha_gid'], captcha_text=captcha_text)
-
+    @staticmethod
+    def _login_challenge(data):
+        ''' Returns the LoginChallenge requested by a dologin response.
+            Raises LoginFailedError if there is none.
+        '''
+        if data.get('captcha_needed') == True and data.get('captcha_gid', '-1') != '-1':
+            return CaptchaChallenge(data)
         elif data.get('emailauth_needed') == True:
-            emailauth = self._handle_emailauth(maildomain=data['emaildomain'], message=data.get('message', ''))
-            self.logger.info('Got e-mail code: "%s"', emailauth)
-            if not emailauth:
-                raise NoEmailCodeError('E-mail code not provided.')
-            return self.login(emailauth=emailauth, emailsteamid=data['emailsteamid'])
-
+            return EmailChallenge(data)
         elif data.get('requires_twofactor') == True:
-            twofactorcode = self._handle_twofactor(message=data.get('message', ''))
-            self.logger.info('Got twofactor code: "%s"', twofactorcode)
-            if not twofactorcode:
-                raise NoTwoFactorCodeError('Two factor code not provided.')
-            return self.login(twofactorcode=twofactorcode)
+            return TwoFactorChallenge(data)
+        raise LoginFailedError('Unable to login', data)
 
+    def _solve_login_challenge(self, challenge):
+        ''' Asks challenge_solver or the handler for the kind of challenge to solve it.
+            Returns the keyword arguments for the next login attempt.
+        '''
+        if self.challenge_solver is not None:
+            code = self.challenge_solver(challenge)
+        elif challenge.kind == 'captcha':
+            code = self._handle_captcha(captcha_data=challenge.image, message=challenge.message)
+        elif challenge.kind == 'emailauth':
+            code = self._handle_emailauth(maildomain=challenge.maildomain, message=challenge.message)
+        elif challenge.kind == 'twofactor':
+            code = self._handle_twofactor(message=challenge.message)
         else:
-            raise LoginFailedError('Unable to login', data)
+            raise LoginFailedError('Unknown login challenge', challenge)
+        self.logger.info('Got %s code: "%s"', challenge.kind, code)
+        return challenge.solve(code).login_args()
 
 class SteamWebBrowserCfg(SteamWebBrowser):
     ''' SteamWebBrowser with built-in config file support
     '''
     def __init__(self):
+        if version_info.major >= 3: # Python 3
+            import configparser
+        else: # Python 2
+            import ConfigParser as configparser
         self.cfg = configparser.ConfigParser()
         self.cfg_path = os.path.join(self.appdata_path, 'config.cfg')
         if os.path.isfile(self.cfg_path):
@@ -0,0 +1,400 @@
+''' SteamWebBrowser for asyncio, requires Python 3.5+ and aiohttp
+'''
+import asyncio
+import codecs
+import json
+import time
+from http.client import HTTPMessage
+from urllib.parse import urljoin
+from urllib.request import Request
+import aiohttp
+from multidict import CIMultiDict
+from requests import HTTPError
+from requests.exceptions import TooManyRedirects
+from .steamwebbrowser import SteamWebBrowser, LoginFailedError, LoginChallenge, REDIRECT_STATUS, _JsonArrayParser
+
+class AsyncResponse(object):
+    ''' A completely read aiohttp response.
+        Mirrors the parts of requests.Response used by steamweb, so body access is not async.
+        Responses of requests with stream=True are not read: content is None and the body
+        has to be read from raw (the aiohttp.ClientResponse), close() them afterwards.
+    '''
+    def __init__(self, response, content, history=(), stream=False):
+        self.status_code = response.status
+        self.reason = response.reason
+        self.url = str(response.url)
+        # Mutable copy, ResponseCache updates the headers of revalidated responses
+        self.headers = CIMultiDict(response.headers)
+        self.content = content
+        self.history = list(history)
+        self.raw = response if stream else None
+        # Guessing the encoding requires the body
+        self.encoding = response.charset if stream else response.get_encoding()
+
+    def close(self):
+        if self.raw is not None:
+            self.raw.close()
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, 'replace')
+
+    def json(self, **kwargs):
+        return json.loads(self.text, **kwargs)
+
+    def raise_for_status(self):
+        ''' Raises requests.HTTPError on 4XX client error or 5XX server error response '''
+        if 400 <= self.status_code < 500:
+            kind = 'Client'
+        elif 500 <= self.status_code < 600:
+            kind = 'Server'
+        else:
+            return
+        raise HTTPError('%s %s Error: %s for url: %s' % (self.status_code, kind, self.reason, self.url),
+                        response=self)
+
+class _CookieResponse(object):
+    ''' Minimal response object for CookieJar.extract_cookies() '''
+    def __init__(self, headers):
+        self._info = HTTPMessage()
+        for name, value in headers.items():
+            self._info[name] = value
+
+    def info(self):
+        return self._info
+
+class AsyncSteamWebBrowser(SteamWebBrowser):
+    ''' SteamWebBrowser doing its requests with aiohttp.
+        get(), post(), login(), logged_in() and close() are coroutines, everything else
+        (login flow, challenge handlers, cookie file) is shared with SteamWebBrowser.
+        The requests session is only used to hold the headers and the cookie jar.
+    '''
+    max_redirects = 30
+    # Same as the HTTPAdapter retries of SteamWebBrowser
+    retries = 2
+    backoff_factor = 0.5
+    retry_status = (500, 502, 503, 504)
+
+    def __init__(self, username=None, password=None, save_interval=0, limit=100):
+        ''' Args:
+                limit: Optional. Maximum number of simultaneous connections.
+        '''
+        super(AsyncSteamWebBrowser, self).__init__(username, password, save_interval)
+        self.limit = limit
+        self._client = None
+        self._login_task = None
+
+    @property
+    def client(self):
+        ''' The aiohttp.ClientSession, created on first use as it needs a running event loop '''
+        if self._client is None or self._client.closed:
+            self._client = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limit),
+                # Cookies are handled by our own cookie jar
+                cookie_jar=aiohttp.DummyCookieJar(),
+            )
+        return self._client
+
+    async def close(self):
+        ''' Write pending cookie changes and close the sessions '''
+        if self._client is not None:
+            await self._client.close()
+        super(AsyncSteamWebBrowser, self).close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @staticmethod
+    def _encode_form(data):
+        ''' aiohttp only accepts strings as form values, convert like requests does '''
+        if not isinstance(data, dict):
+            return data
+        return {k: v.decode('utf-8') if isinstance(v, bytes) else str(v) for k, v in data.items()}
+
+    async def _send(self, method, url, params=None, data=None, headers=None, stream=False, **kwargs):
+        ''' Send a single request, retrying on server errors.
+            With stream, the body of the final response (no redirect or retry) is not read.
+        '''
+        for retry in range(self.retries + 1):
+            request_headers = dict(self.session.headers)
+            if headers:
+                request_headers.update(headers)
+            cookie_request = Request(url)
+            self.session.cookies.add_cookie_header(cookie_request)
+            if cookie_request.has_header('Cookie'):
+                request_headers['Cookie'] = cookie_request.get_header('Cookie')
+            response = await self.client.request(method, url, params=params, data=data, headers=request_headers,
+                                                 allow_redirects=False, **kwargs)
+            self.session.cookies.extract_cookies(_CookieResponse(response.headers), cookie_request)
+            final = response.status not in self.retry_status or retry == self.retries
+            if stream and final and response.status not in REDIRECT_STATUS:
+                return AsyncResponse(response, None, stream=True)
+            try:
+                content = await response.read()
+            finally:
+                response.release()
+            if final:
+                return AsyncResponse(response, content)
+            self.logger.debug('Retrying %s "%s" after status %d', method, url, response.status)
+            await asyncio.sleep(self.backoff_factor * (2 ** retry))
+
+    async def _request(self, method, url, params=None, data=None, allow_redirects=True, **kwargs):
+        ''' Send a request and follow redirects.
+            Redirects are followed here (and not by aiohttp) to store cookies of every response.
+        '''
+        history = []
+        while True:
+            r = await self._send(method, url, params=params, data=data, **kwargs)
+            location = r.headers.get('Location')
+            if (not allow_redirects or r.status_code not in REDIRECT_STATUS or not location
+                    or (self.early_expiry_detection and self._session_expired(r))):
+                r.history = history
+                return r
+            history.append(r)
+            if len(history) > self.max_redirects:
+                raise TooManyRedirects('Exceeded %d redirects.' % self.max_redirects)
+            url = urljoin(r.url, location)
+            params = None
+            if (r.status_code in (302, 303) and method != 'HEAD') or (r.status_code == 301 and method == 'POST'):
+                method = 'GET'
+                data = None
+
+    async def _relogin(self, logins, background=False):
+        ''' Login once, even if many requests notice the expired session at the same time '''
+        if self._login_count != logins:
+            return True
+        if background and self.challenge_solver is None:
+            # Not shared as it does not login, requests noticing the expiry meanwhile have to
+            return await self._renew_session(background)
+        if self._login_task is None or self._login_task.done():
+            self._login_task = asyncio.ensure_future(self._renew_session(background))
+        # Don't cancel the login for everyone if one of the waiting requests gets cancelled
+        return await asyncio.shield(self._login_task)
+
+    async def _renew_session(self, background):
+        steamid = await self.refresh_session()
+        if steamid or not self._may_login(background):
+            return steamid
+        return await self.login()
+
+    async def refresh_session(self):
+        values = self._token_refresh_values()
+        if values is None:
+            return None
+        # Use _request directly as self.post() would login on an expired session
+        r = await self._request('POST', self.wgtoken_url, data=values)
+        return self._token_refresh_result(r.status_code, r.text)
+
+    def _schedule_session_refresh(self, delay=None):
+        ''' Runs the background session refresh as a task of the event loop instead of a thread.
+            enable_session_refresh() has to be called from a coroutine.
+        '''
+        if self.session_refresh_margin is None:
+            return
+        if delay is None:
+            delay = self._session_refresh_delay()
+        with self._refresh_lock:
+            if self._refresh_timer is not None:
+                self._refresh_timer.cancel()
+            self.logger.debug('Next session refresh check in %.0f seconds', delay)
+            self._refresh_timer = asyncio.get_event_loop().call_later(
+                delay, lambda: asyncio.ensure_future(self._refresh_session_ahead()))
+
+    async def _refresh_session_ahead(self):
+        delay = None
+        try:
+            due = self._session_refresh_due()
+            if due is None:
+                due = not await self.logged_in()
+            if due:
+                self.logger.info('Session expires soon, renewing it')
+                if not await self._relogin(self._login_count, background=True):
+                    self.logger.warning('Renewing the session failed')
+                    delay = self.session_check_interval
+                elif self._session_refresh_due():
+                    # The expiry did not move, don't renew again right away
+                    delay = self.session_check_interval
+        except Exception: # pylint:disable=broad-except
+            self.logger.exception('Renewing the session failed')
+            delay = self.session_check_interval
+        self._schedule_session_refresh(delay)
+
+    async def _instrumented_request(self, info, method, url, **kwargs):
+        g = self.session.cookies.generation
+        start = time.time()
+        r = await self._request(method, url, **kwargs)
+        info.response(r, start, stream=kwargs.get('stream', False))
+        try:
+            r.raise_for_status()
+        except HTTPError:
+            r.close()
+            raise
+        if g != self.session.cookies.generation:
+            # Cookies have changed
+            start = time.time()
+            self._save_cookies()
+            info.timed('save_cookies', start)
+            info.cookies_saved = True
+        return r
+
+    async def _relogin_expired(self, info, logins):
+        self._logged_in_cache = (0, False)
+        self.logger.warning('Session expired while %s, trying to login again', info.method)
+        info.relogin = True
+        start = time.time()
+        try:
+            return await self._relogin(logins)
+        finally:
+            info.timed('relogin', start)
+
+    async def post(self, url, data=None, **kwargs):
+        self.logger.debug('POST "%s", data: "%s", kwargs: "%s"', url, data, kwargs)
+        info = self._start_request('POST', url)
+        try:
+            return await self._expiry_aware_request(info, 'POST', url, data=self._encode_form(data), **kwargs)
+        except Exception as e:
+            info.error = e
+            raise
+        finally:
+            self._finish_request(info)
+
+    async def get(self, url, force_refresh=False, **kwargs):
+        ''' GET url, answered from response_cache if enabled (see SteamWebBrowser.get()) '''
+        self.logger.debug('GET "%s", kwargs: "%s"', url, kwargs)
+        info = self._start_request('GET', url)
+        try:
+            r, cache_key, stale, request_kwargs = self._cache_lookup(info, url, force_refresh, kwargs)
+            if r is not None:
+                return r
+            r = await self._expiry_aware_request(info, 'GET', url, **request_kwargs)
+            if r is None:
+                return r
+            return self._cache_response(url, cache_key, stale, r)
+        except Exception as e:
+            info.error = e
+            raise
+        finally:
+            self._finish_request(info)
+
+    async def get_many(self, urls, max_workers=8, ordered=True, **kwargs):
+        ''' Fetch urls with get() concurrently, at most max_workers at a time.
+            Returns a list of (url, response) tuples, in order of urls if ordered is True,
+            else in the order the requests complete. The first exception raised by get() is raised.
+        '''
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def fetch(url):
+            async with semaphore:
+                return url, await self.get(url, **kwargs)
+        fetches = [fetch(url) for url in urls]
+        if ordered:
+            return list(await asyncio.gather(*fetches))
+        return [await f for f in asyncio.as_completed(fetches)]
+
+    async def iter_json_array(self, url, marker, chunk_size=16384, **kwargs):
+        ''' Asynchronous generator version of SteamWebBrowser.iter_json_array() (Python 3.6+):
+            async for game in swb.iter_json_array(games_url, 'var rgGames = '): ...
+        '''
+        parser = _JsonArrayParser(url, marker)
+        r = await self.get(url, stream=True, **kwargs)
+        try:
+            decoder = codecs.getincrementaldecoder(r.encoding or 'utf-8')('replace')
+            async for chunk in r.raw.content.iter_chunked(chunk_size):
+                for element in parser.feed(decoder.decode(chunk)):
+                    yield element
+                if parser.done:
+                    return
+            for element in parser.feed(decoder.decode(b'', final=True)) + parser.close():
+                yield element
+        finally:
+            # Don't download the rest of the page
+            r.close()
+
+    async def _expiry_aware_request(self, info, method, url, relogin=True, **kwargs):
+        logins = self._login_count
+        r = await self._instrumented_request(info, method, url, **kwargs)
+        if self._session_expired(r):
+            r.close()
+            if not relogin:
+                self.logger.error('Session expired again after login during %s', method)
+            # Session expired, login again
+            elif await self._relogin_expired(info, logins):
+                # Retry once with the new session
+                return await self._expiry_aware_request(info, method, url, relogin=False, **kwargs)
+            else:
+                self.logger.error('Login failed during %s', method)
+        else:
+            return r
+
+    async def _get_rsa_key(self):
+        ''' get steam RSA key and build cipher '''
+        req = await self.post(self.rsa_key_url, data=self._rsa_key_values())
+        self._set_rsa_key(req.json())
+
+    async def logged_in(self):
+        if not self._may_be_logged_in():
+            return False
+        checked, result = self._logged_in_cache
+        if result and time.time() - checked < self.logged_in_ttl:
+            return True
+        # Use _request directly as self.get() will trigger login if not logged in
+        r = await self._request('GET', self.login_probe_url, allow_redirects=False)
+        self.logger.debug('Response headers: %s', r.headers)
+        result = self._probe_logged_in(r.status_code, r.headers.get('Location', ''))
+        self._logged_in_cache = (time.time(), result)
+        return result
+
+    async def login(self, captchagid='-1', captcha_text='', emailauth='', emailsteamid='',
+                loginfriendlyname='', twofactorcode=''): # pylint:disable=too-many-arguments
+        result = await self._login_step(captchagid, captcha_text, emailauth, emailsteamid,
+                                        loginfriendlyname, twofactorcode)
+        while isinstance(result, LoginChallenge):
+            # Challenge handlers may block (input(), Tk mainloop), keep them out of the event loop
+            kwargs = await asyncio.get_event_loop().run_in_executor(None, self._solve_login_challenge, result)
+            result = await self._login_step(**kwargs)
+        return result
+
+    async def start_login(self):
+        return await self._login_step()
+
+    async def resume_login(self, challenge):
+        return await self._login_step(**challenge.login_args())
+
+    async def _login_step(self, captchagid='-1', captcha_text='', emailauth='', emailsteamid='',
+                loginfriendlyname='', twofactorcode=''): # pylint:disable=too-many-arguments
+        self.logger.info('login called with: captchagid="%s", captcha_text="%s", emailauth="%s",'
+                        ' emailsteamid="%s", loginfriendlyname="%s", twofactorcode="%s"',
+                        captchagid, captcha_text, emailauth, emailsteamid, loginfriendlyname,
+                        twofactorcode,
+        )
+        cached_key = self._use_cached_rsa_key()
+        if not cached_key:
+            await self._get_rsa_key()
+
+        login_args = dict(captchagid=captchagid, captcha_text=captcha_text,
+                        emailauth=emailauth, emailsteamid=emailsteamid,
+                        loginfriendlyname=loginfriendlyname, twofactorcode=twofactorcode)
+        req = await self.post(self.dologin_url, data=self._login_values(**login_args))
+        self.logger.debug('login response: "%s"', req.text)
+        data = req.json()
+        steamid = self._login_result(data)
+        if steamid:
+            # Logged in
+            return steamid
+
+        try:
+            challenge = self._login_challenge(data)
+        except LoginFailedError:
+            if not cached_key:
+                raise
+            # Steam may have rejected the timestamp of the cached RSA key
+            self.logger.info('Login failed with cached RSA key, retrying with a new one')
+            self._forget_rsa_key()
+            return await self._login_step(**login_args)
+        if challenge.kind == 'captcha':
+            challenge.image = (await self.get(self.captcha_url, params={'gid': challenge.gid})).content
+        self.logger.info('Login requires a %s code', challenge.kind)
+        return challenge
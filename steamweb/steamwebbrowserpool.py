@@ -0,0 +1,230 @@
+import logging
+from collections import deque
+from contextlib import contextmanager
+from threading import Condition
+from time import time
+from requests import RequestException
+from .steamwebbrowser import (SteamWebBrowser, SteamWebError, LoginFailedError, IncorrectLoginError, InputError,
+                              LoginChallenge, ChallengePendingError)
+
+class PoolError(SteamWebError):
+    ''' Raised when no browser could be leased from the pool '''
+    pass
+
+class SteamWebBrowserPool(object):
+    ''' Manages SteamWebBrowser instances for many accounts.
+
+    Every account has its own session and cookie file but all of them share one
+    connection pool. Browsers are created and logged in lazily on their first lease.
+    Accounts that fail to login max_login_failures times in a row (or with wrong
+    credentials) are evicted from the pool. With on_challenge, accounts whose login waits
+    for a captcha or SteamGuard code are skipped until the code is given to solve(). A login
+    after the session expired in get() or post() then raises ChallengePendingError.
+
+    Usage:
+        pool = SteamWebBrowserPool([('user1', 'password1'), ('user2', 'password2')])
+        with pool.lease() as swb:
+            swb.get('https://store.steampowered.com/account/')
+    '''
+    def __init__(self, accounts=(), browser_class=SteamWebBrowser, pool_connections=10, pool_maxsize=10,
+                max_login_failures=3, rate_limiter=None, on_challenge=None, **kwargs): # pylint:disable=too-many-arguments
+        ''' Args:
+                accounts: Optional. Iterable of (username, password) tuples.
+                browser_class: Optional. SteamWebBrowser subclass accepting (username, password)
+                    and the adapter keyword argument.
+                pool_connections: Optional. Number of connection pools (hosts) to cache.
+                pool_maxsize: Optional. Maximum number of connections to keep per host, this
+                    should be at least the number of threads using the pool.
+                max_login_failures: Optional. Number of consecutive failed logins after which
+                    an account is evicted.
+                rate_limiter: Optional. A RateLimiter shared by all accounts, see make_adapter().
+                on_challenge: Optional. Callable(username, LoginChallenge) called when the login of
+                    an account needs a code. The login is then continued once the code is given
+                    to solve() instead of blocking the leasing thread in the challenge handlers.
+                    It is installed as challenge_solver of the browsers for this.
+                kwargs: Passed to browser_class for every account.
+        '''
+        self.logger = logging.getLogger(str(__name__)+'.'+str(self.__class__.__name__))
+        self.adapter = browser_class.make_adapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                                  rate_limiter=rate_limiter)
+        self.max_login_failures = max_login_failures
+        self.evicted = {} # username -> exception of the last login attempt
+        self.on_challenge = on_challenge
+        self.pending = {} # username -> LoginChallenge waiting for solve()
+        self._browser_class = browser_class
+        self._kwargs = kwargs
+        self._passwords = {}
+        self._browsers = {}
+        self._usernames = {} # browser -> username
+        self._logged_in = set()
+        self._failures = {}
+        self._idle = deque()
+        self._cond = Condition()
+        for username, password in accounts:
+            self.add(username, password)
+
+    def __len__(self):
+        ''' Number of accounts in the pool (not evicted) '''
+        return len(self._passwords)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add(self, username, password):
+        with self._cond:
+            if username in self._passwords:
+                raise ValueError('Account "%s" is already in the pool' % username)
+            self._passwords[username] = password
+            self._failures[username] = 0
+            self.evicted.pop(username, None)
+            self._idle.append(username)
+            self._cond.notify()
+
+    def _browser(self, username):
+        if username not in self._browsers:
+            swb = self._browser_class(username, self._passwords[username], adapter=self.adapter, **self._kwargs)
+            if self.on_challenge is not None:
+                swb.challenge_solver = self._challenge_solver(username)
+            self._browsers[username] = swb
+            self._usernames[swb] = username
+        return self._browsers[username]
+
+    def _evict(self, username, error):
+        self.logger.error('Evicting account "%s": %s', username, error)
+        with self._cond:
+            self.evicted[username] = error
+            del self._passwords[username]
+            del self._failures[username]
+            swb = self._browsers.pop(username, None)
+            self._usernames.pop(swb, None)
+            self._logged_in.discard(username)
+            self.pending.pop(username, None)
+            # Wake up waiters so they notice an empty pool
+            self._cond.notify_all()
+        if swb is not None:
+            swb.close()
+
+    def _ensure_login(self, username, swb):
+        ''' Returns True if swb is logged in, False if the login failed.
+            Failed accounts are either evicted or put back at the end of the idle queue.
+        '''
+        if username in self._logged_in:
+            # Later session expiry is handled by swb.get()/swb.post()
+            return True
+        try:
+            if username in self.pending:
+                result = swb.resume_login(self.pending.pop(username))
+                if isinstance(result, LoginChallenge):
+                    self._park(username, result)
+                    return False
+            elif not swb.logged_in():
+                swb.login()
+        except ChallengePendingError:
+            # Parked by the challenge_solver
+            return False
+        except IncorrectLoginError as e:
+            # Will never succeed
+            self._evict(username, e)
+            return False
+        except (LoginFailedError, InputError, RequestException) as e:
+            self._failures[username] += 1
+            self.logger.warning('Login of "%s" failed (%d/%d): %s',
+                                username, self._failures[username], self.max_login_failures, e)
+            if self._failures[username] >= self.max_login_failures:
+                self._evict(username, e)
+            else:
+                self.release(swb)
+            return False
+        self._failures[username] = 0
+        self._logged_in.add(username)
+        return True
+
+    def _park(self, username, challenge):
+        ''' Keep the account out of the idle queue until solve() puts it back '''
+        self.logger.info('Login of "%s" waits for a %s code', username, challenge.kind)
+        with self._cond:
+            self.pending[username] = challenge
+            self._logged_in.discard(username)
+        self.on_challenge(username, challenge)
+
+    def _challenge_solver(self, username):
+        ''' Returns the challenge_solver for the browser of username. Instead of waiting for
+            a code it parks the account and aborts the login, which releases the login lock
+            and the lease of the cookie file.
+        '''
+        def solver(challenge):
+            self._park(username, challenge)
+            raise ChallengePendingError('Login of "%s" waits for a %s code' % (username, challenge.kind), challenge)
+        return solver
+
+    def solve(self, username, code):
+        ''' Give the code for the pending LoginChallenge of username.
+            Its login is continued when the account is leased next.
+        '''
+        with self._cond:
+            challenge = self.pending[username]
+            queued = challenge.solved
+            challenge.solve(code)
+            if not queued:
+                self._idle.append(username)
+                self._cond.notify()
+
+    def acquire(self, timeout=None):
+        ''' Returns a logged in SteamWebBrowser which must be given back with release().
+            Waits up to timeout seconds (forever if None) for an account to become available.
+            Raises PoolError if there is none.
+        '''
+        deadline = None if timeout is None else time() + timeout
+        while True:
+            with self._cond:
+                while not self._idle:
+                    if not self._passwords:
+                        raise PoolError('No accounts left in pool', self.evicted)
+                    remaining = None if deadline is None else deadline - time()
+                    if remaining is not None and remaining <= 0:
+                        raise PoolError('Timeout waiting for an idle account')
+                    self._cond.wait(remaining)
+                username = self._idle.popleft()
+            # Creating and logging in the browser is done without holding the lock
+            try:
+                swb = self._browser(username)
+            except:
+                with self._cond:
+                    self._idle.append(username)
+                    self._cond.notify()
+                raise
+            if self._ensure_login(username, swb):
+                return swb
+
+    def release(self, swb):
+        ''' Give a browser obtained by acquire() back to the pool '''
+        with self._cond:
+            username = self._usernames.get(swb)
+            if username is None:
+                # Evicted while leased
+                return
+            if username in self.pending:
+                # Waits for solve() to put it back
+                return
+            self._idle.append(username)
+            self._cond.notify()
+
+    @contextmanager
+    def lease(self, timeout=None):
+        ''' Context manager around acquire() and release() '''
+        swb = self.acquire(timeout)
+        try:
+            yield swb
+        finally:
+            self.release(swb)
+
+    def close(self):
+        ''' Close all browsers and the shared connection pool '''
+        with self._cond:
+            browsers = list(self._browsers.values())
+        for swb in browsers:
+            swb.close()
+        self.adapter.close()
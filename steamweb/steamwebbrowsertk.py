@@ -1,16 +1,17 @@
 from .steamwebbrowser import SteamWebBrowserCfg
 from sys import version_info
-from PIL.ImageTk import PhotoImage
-if version_info.major >= 3: # Python3
-    import tkinter as tk
-else: # Python 2
-    import Tkinter as tk
 
 class SteamWebBrowserTk(SteamWebBrowserCfg):
     ''' SteamWebBrowserCfg with Tkinter UI for displaying captcha image
     '''
     @staticmethod
     def _handle_captcha(captcha_data, message=''):
+        # Only load the GUI toolkit if a captcha has to be solved
+        from PIL.ImageTk import PhotoImage
+        if version_info.major >= 3: # Python3
+            import tkinter as tk
+        else: # Python 2
+            import Tkinter as tk
         tk_root = tk.Tk()
         def close(captcha_text):
             if captcha_text.get() != '':
@@ -1,32 +1,91 @@
 from __future__ import print_function
-from re import search, match, finditer, DOTALL, MULTILINE
-from copy import copy
-from sys import version_info
-if version_info.major >= 3:
-    from html.parser import HTMLParser
-else:
-    from HTMLParser import HTMLParser
+import os
+from re import match
+from concurrent.futures import ThreadPoolExecutor
 
 from steamweb.steamwebbrowser import SteamWebBrowserCfg
+from steamweb.parsers import parse_friends, parse_concurrent_players
+from steamweb.friendgraph import FriendGraph
 
 def get_friends(swb, id):
     r = swb.get('http://steamcommunity.com/{id}/friends'.format(id=id))
-    return [friend.group(1) for friend in finditer('<a class="friendBlockLinkOverlay" href="http://steamcommunity.com/(.*?)"></a>', r.content)]
+    return parse_friends(r.text)
 
 def get_concurrent_players(swb):
     r = swb.get('http://steamcommunity.com/my/friends/players')
-    if match('http://steamcommunity.com/id/[^/]+/friends/$', r.url):
+    if match('https?://steamcommunity.com/id/[^/]+/friends/$', r.url):
         raise Exception('Not in game.')
-    players = []
-    playerNames = {}
-    for player in finditer('<a class="friendBlockLinkOverlay" href="http://steamcommunity.com/(.*?)".*?<div>(.*?)<br />', r.content, MULTILINE | DOTALL):
-        players.append(player.group(1))
-        playerNames[player.group(1)] = player.group(2).strip()
-    # The player who called the program
-    player = search('<a href="http://steamcommunity.com/(.*?)" data-miniprofile="\d*">(.*?)</a>', r.content)
-    players.append(player.group(1))
-    playerNames[player.group(1)] = player.group(2)
-    return players, playerNames
+    # The player who called the program is the last one
+    players = parse_concurrent_players(r.text)
+    return [p.path for p in players], dict(players)
+
+def get_friend_sets(swb, players, max_workers=10):
+    ''' Fetch the friend lists of players concurrently.
+        Returns a dict of player -> set of friends.
+    '''
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        friend_lists = executor.map(lambda player: get_friends(swb, player), players)
+        return dict((player, set(friends)) for player, friends in zip(players, friend_lists))
+
+class UnionFind(object):
+    ''' Disjoint sets with union by size and path compression '''
+    def __init__(self, items=()):
+        self.parent = {}
+        self.size = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        if item not in self.parent:
+            self.parent[item] = item
+            self.size[item] = 1
+
+    def find(self, item):
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # Path compression
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return a
+
+    def groups(self):
+        ''' Returns a list of sets '''
+        groups = {}
+        for item in self.parent:
+            groups.setdefault(self.find(item), set()).add(item)
+        return list(groups.values())
+
+def find_groups(players, friend_sets):
+    ''' Returns the list of groups (sets) of players connected by friendship, directly or via other players.
+        A friendship listed by either of both players counts (friend lists may be private).
+
+    Args:
+        players: Iterable of players.
+        friend_sets: Dict of player -> set of friends, see get_friend_sets().
+    '''
+    groups = UnionFind(players)
+    for player, friends in friend_sets.items():
+        if player not in groups.parent:
+            continue
+        # Iterate the smaller side, membership tests are O(1)
+        if len(friends) > len(groups.parent):
+            connected = [p for p in groups.parent if p in friends]
+        else:
+            connected = [f for f in friends if f in groups.parent]
+        for friend in connected:
+            groups.union(player, friend)
+    return groups.groups()
 
 if __name__ == "__main__":
     swb = SteamWebBrowserCfg()
@@ -34,25 +93,11 @@ if __name__ == "__main__":
         swb.login()
     players, playerNames = get_concurrent_players(swb)
 
-    groups = []
-    for player in players:
-        group = set([player])
-        for friend in get_friends(swb, player):
-            if friend in players:
-                group.add(friend)
-        groups.append(group)
-
-    i = 0
-    while i < len(groups):
-        for player in copy(groups[i]):
-            j = 0
-            while j < i:
-                if player in groups[j]:
-                    groups[i].update(groups[j])
-                    del groups[j]
-                    i -= 1
-                j += 1
-        i += 1
+    # Friend lists change rarely, only fetch those that are unknown or older than a day
+    graph = FriendGraph(os.path.join(swb.appdata_path, 'friendgraph.sqlite'))
+    graph.refresh(players, lambda stale: get_friend_sets(swb, stale))
+    groups = find_groups(players, graph.connections(players))
+    graph.close()
 
     out = 'say "Groups in this game:"'
     if len(groups) == len(players):
@@ -63,6 +108,6 @@ if __name__ == "__main__":
                 continue
             out += '; wait 60;say "Group of size '+str(len(group))+': '
             for player in group:
-                out += HTMLParser().unescape(playerNames[player]).decode('utf-8')+', '
+                out += playerNames[player]+', '
             out = out[:-2] + '"'
     print(out)
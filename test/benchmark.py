@@ -0,0 +1,306 @@
+''' Benchmarks of the request path, the login flow and the page parsers
+
+Requests go to a local stand-in for steamcommunity.com which answers getrsakey, dologin and
+captcha.php with the mocks of test_steamwebbrowser. Results are written as JSON:
+
+    python -m test.benchmark --output bench.json
+'''
+from __future__ import print_function
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from contextlib import contextmanager
+from threading import Thread
+from sys import version_info
+if version_info.major >= 3: # Python 3
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from http.cookiejar import Cookie
+    from urllib.parse import urlparse, parse_qs
+    from time import perf_counter as clock
+    import tracemalloc
+else: # Python 2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from cookielib import Cookie
+    from urlparse import urlparse, parse_qs
+    from time import time as clock
+    tracemalloc = None
+
+from steamweb.steamwebbrowser import SteamWebBrowser
+from steamweb import parsers
+from . import test_parsers
+from .test_steamwebbrowser import SteamWebBrowserMocked, RSA, PKCS1_v1_5, random_number
+
+# Milliseconds importing steamweb may take on top of requests
+IMPORT_BUDGET_MS = 50
+
+class FakeSteam(object):
+    ''' The login endpoints of SteamWebBrowserMocked without httpretty '''
+    generate_dologin_response = SteamWebBrowserMocked.__dict__['generate_dologin_response']
+    generate_captcha_response = SteamWebBrowserMocked.__dict__['generate_captcha_response']
+
+    def __init__(self):
+        self.rsa_full = RSA.generate(2048)
+        self.cipher_full = PKCS1_v1_5.new(self.rsa_full)
+        self._content_type_json = 'application/json; charset=utf-8'
+        self._steamid = str(random_number(17))
+        self.challenges = []
+        self.reset()
+        self.pages = {
+            '/page/small': b'x' * 1024,
+            '/page/large': b'x' * 512 * 1024,
+        }
+
+    def reset(self):
+        ''' Ask for the challenges again on the next login '''
+        self._login_stage = list(self.challenges)
+
+    def rsa_key(self):
+        return json.dumps({
+            'success': True,
+            'publickey_mod': format(self.rsa_full.n, 'x').upper(),
+            'publickey_exp': format(self.rsa_full.e, 'x').upper(),
+            'timestamp': '64861350000',
+        })
+
+    def handle(self, method, path, query):
+        ''' Returns (status, headers, body) '''
+        if method == 'POST' and path == '/mobilelogin/getrsakey/':
+            return 200, {'Content-Type': self._content_type_json}, self.rsa_key()
+        if method == 'POST' and path == '/mobilelogin/dologin/':
+            return self.generate_dologin_response(None, path, {})
+        if method == 'GET' and path == '/public/captcha.php':
+            return self.generate_captcha_response(None, path, {})
+        if path in self.pages:
+            return 200, {'Content-Type': 'text/html; charset=utf-8'}, self.pages[path]
+        return 404, {}, 'Not found'
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep-alive
+    # Headers and body are written separately, don't wait for delayed ACKs
+    disable_nagle_algorithm = True
+
+    def _handle(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        url = urlparse(self.path)
+        status, headers, body = self.server.steam.handle(method, url.path, parse_qs(url.query))
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def log_message(self, *args): # pylint:disable=arguments-differ
+        pass
+
+class FakeSteamServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, steam):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), _Handler)
+        self.steam = steam
+        self.url = 'http://127.0.0.1:%d' % self.server_address[1]
+        self._thread = Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+def make_browser_class(url):
+    class BenchSteamWebBrowser(SteamWebBrowser):
+        rsa_key_url = url + '/mobilelogin/getrsakey/'
+        dologin_url = url + '/mobilelogin/dologin/'
+        captcha_url = url + '/public/captcha.php'
+
+        @staticmethod
+        def _handle_captcha(captcha_data, message=''):
+            return 'CAPTCHA'
+
+        @staticmethod
+        def _handle_emailauth(maildomain='', message=''):
+            return 'EMAIL'
+
+        @staticmethod
+        def _handle_twofactor(message=''):
+            return 'TWOFACTOR'
+    return BenchSteamWebBrowser
+
+def fill_cookie_jar(swb, count):
+    ''' Add count cookies sent with every request to the fake server '''
+    for i in range(count):
+        swb.session.cookies.set_cookie(Cookie(version=0, name='cookie%d' % i, value='v' * 32,
+            port=None, port_specified=False,
+            domain='127.0.0.1', domain_specified=False, domain_initial_dot=False,
+            path='/', path_specified=True,
+            secure=False, expires=None, discard=False, comment=None, comment_url=None, rest={},
+        ))
+    swb.flush_cookies()
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100.0))]
+
+def measure(func, iterations):
+    ''' Call func iterations times, returns throughput and latency in milliseconds '''
+    latencies = []
+    start = clock()
+    for _ in range(iterations):
+        t = clock()
+        func()
+        latencies.append(clock() - t)
+    total = clock() - start
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'per_second': iterations / total,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': total / iterations * 1000,
+    }
+
+@contextmanager
+def quiet():
+    ''' Hide output of the login flow '''
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        yield
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+def bench_requests(browser_class, url, iterations):
+    results = {}
+    for jar_size in (0, 200):
+        swb = browser_class('bench%d' % jar_size, 'password')
+        fill_cookie_jar(swb, jar_size)
+        swb.get(url + '/page/small') # connect
+        for page in ('small', 'large'):
+            results['get_%s_jar%d' % (page, jar_size)] = measure(
+                lambda: swb.get(url + '/page/' + page), iterations)
+        results['post_small_jar%d' % jar_size] = measure(
+            lambda: swb.post(url + '/page/small', data={'key': 'value'}), iterations)
+        swb.close()
+    return results
+
+def bench_login(browser_class, steam, iterations):
+    results = {}
+    for name, challenges in (('login', []), ('login_challenges', ['email', 'twocfactor', 'captcha'])):
+        steam.challenges = challenges
+        swb = browser_class('login', 'password')
+
+        def login():
+            # Include fetching the RSA key
+            SteamWebBrowser._rsa_keys.clear()
+            steam.reset()
+            swb.login()
+        with quiet():
+            results[name] = measure(login, iterations)
+        swb.close()
+    return results
+
+def bench_parsers(iterations):
+    # Fixture pages, repeated to the size of real pages
+    pages = {
+        'parse_profile': (parsers.parse_profile, test_parsers.PROFILE),
+        'parse_badges': (parsers.parse_badges, test_parsers.BADGE % {
+            'id': 'badge_1', 'name': 'Years of Service', 'level': 'Level 5,', 'xp': 250,
+            'date': 'Jan 2, 2015 @ 1:02pm'} * 200),
+        'parse_achievements': (parsers.parse_achievements, test_parsers.ACHIEVEMENTS * 200),
+        'parse_player_achievements': (parsers.parse_player_achievements, test_parsers.PLAYER_ACHIEVEMENTS * 200),
+        'parse_friends': (parsers.parse_friends, test_parsers.FRIENDS * 150),
+        'parse_games': (parsers.parse_games, test_parsers.GAMES),
+    }
+    return dict((name, measure(lambda: parse(text), iterations)) for name, (parse, text) in pages.items())
+
+def bench_memory(browser_class, count=20):
+    ''' Returns the bytes allocated per browser instance '''
+    if tracemalloc is None:
+        return None
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    browsers = [browser_class('memory%d' % i, 'password') for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    for swb in browsers:
+        swb.close()
+    return {'sessions': count, 'bytes_per_session': (after - before) // count}
+
+def bench_import(runs=5):
+    ''' Time of a fresh import of requests and of steamweb on top of it, best of runs '''
+    code = ('import time; t = time.time(); import requests; r = time.time(); import steamweb; '
+            'print(r - t, time.time() - r)')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    timings = []
+    for _ in range(runs):
+        out = subprocess.check_output([sys.executable, '-c', code], cwd=root)
+        timings.append([float(t) * 1000 for t in out.split()])
+    requests_ms = min(t[0] for t in timings)
+    steamweb_ms = min(t[1] for t in timings)
+    return {
+        'requests_ms': requests_ms,
+        'steamweb_ms': steamweb_ms,
+        'budget_ms': IMPORT_BUDGET_MS,
+        'within_budget': steamweb_ms <= IMPORT_BUDGET_MS,
+    }
+
+def run(iterations=200, login_iterations=10):
+    temp_dir = tempfile.mkdtemp()
+    os.environ['STEAMWEBROWSER_HOME'] = temp_dir
+    steam = FakeSteam()
+    server = FakeSteamServer(steam)
+    try:
+        browser_class = make_browser_class(server.url)
+        results = {}
+        results.update(bench_requests(browser_class, server.url, iterations))
+        results.update(bench_login(browser_class, steam, login_iterations))
+        results.update(bench_parsers(iterations))
+        results['memory'] = bench_memory(browser_class)
+        results['import'] = bench_import()
+    finally:
+        server.close()
+        shutil.rmtree(temp_dir)
+    return {
+        'time': time.time(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200, help='Requests per benchmark')
+    parser.add_argument('--login-iterations', type=int, default=10, help='Logins per benchmark')
+    parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+    args = parser.parse_args()
+    results = run(args.iterations, args.login_iterations)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(results, indent=2, sort_keys=True))
+
+if __name__ == '__main__':
+    main()
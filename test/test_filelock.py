@@ -0,0 +1,22 @@
+import os
+import shutil
+import unittest
+import tempfile
+
+from steamweb.filelock import FileLock
+
+class TestFileLock(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'cookies.lwp.lock')
+
+    def tearDown(self):
+        if os.path.isdir(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+
+    def test_exclusive(self):
+        with FileLock(self.path):
+            self.assertFalse(FileLock(self.path).acquire(timeout=0.1))
+        lock = FileLock(self.path)
+        self.assertTrue(lock.acquire(timeout=0.1))
+        lock.release()
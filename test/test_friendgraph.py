@@ -0,0 +1,39 @@
+import os
+import shutil
+import unittest
+import tempfile
+import mock
+
+from steamweb.friendgraph import FriendGraph
+
+class TestFriendGraph(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'friendgraph.sqlite')
+
+    def tearDown(self):
+        if os.path.isdir(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+
+    def test_refresh(self):
+        fetch = mock.Mock(return_value={'id/a': {'id/b', 'id/x'}, 'id/b': set(), 'id/c': set()})
+        graph = FriendGraph(self.path, max_age=60)
+        self.assertEqual(graph.refresh(['id/a', 'id/b', 'id/c'], fetch), ['id/a', 'id/b', 'id/c'])
+        self.assertEqual(graph.friends('id/a'), {'id/b', 'id/x'})
+        graph.close()
+
+        # Stored on disk, only stale players are fetched again
+        graph = FriendGraph(self.path, max_age=60)
+        fetch = mock.Mock(return_value={'id/d': {'id/c'}})
+        self.assertEqual(graph.refresh(['id/a', 'id/b', 'id/c', 'id/d'], fetch), ['id/d'])
+        fetch.assert_called_once_with(['id/d'])
+        self.assertEqual(graph.connections(['id/a', 'id/b', 'id/c', 'id/d']),
+                         {'id/a': {'id/b'}, 'id/b': set(), 'id/c': set(), 'id/d': {'id/c'}})
+
+        with mock.patch('time.time', return_value=2e10):
+            self.assertEqual(graph.stale(['id/a', 'id/d']), ['id/a', 'id/d'])
+            # Any iterable of players
+            self.assertEqual(graph.stale(p for p in ['id/a', 'id/d']), ['id/a', 'id/d'])
+        graph.update({'id/a': set()})
+        self.assertEqual(graph.friends('id/a'), set())
+        graph.close()
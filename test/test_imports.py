@@ -0,0 +1,14 @@
+import os
+import sys
+import unittest
+import subprocess
+
+# Only needed for logins, captchas and optional features, must not be loaded by "import steamweb"
+LAZY_MODULES = ('Crypto', 'PIL', 'tkinter', 'Tkinter', 'sqlite3', 'concurrent.futures', 'configparser', 'aiohttp')
+
+class TestImports(unittest.TestCase):
+    def test_lazy_imports(self):
+        code = 'import sys, steamweb, steamweb.steamwebbrowsertk; print(" ".join(sorted(sys.modules)))'
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        modules = subprocess.check_output([sys.executable, '-c', code], cwd=root).decode('ascii').split()
+        self.assertEqual([m for m in LAZY_MODULES if m in modules], [])
@@ -0,0 +1,61 @@
+import os
+import shutil
+import unittest
+import tempfile
+import httpretty
+from requests import HTTPError
+
+from steamweb.steamwebbrowser import SteamWebBrowser
+from steamweb.instrumentation import Instrument, MetricsAggregator, prometheus_text
+
+class Recorder(Instrument):
+    def __init__(self):
+        self.before = []
+        self.after = []
+
+    def before_request(self, info):
+        self.before.append(info)
+
+    def after_request(self, info):
+        self.after.append(info)
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        os.environ['STEAMWEBROWSER_HOME'] = self.temp_dir
+
+    def tearDown(self):
+        if os.path.isdir(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+
+    @httpretty.activate
+    def test_hooks(self):
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/id/player', body='profile',
+                                adding_headers={'Set-Cookie': 'sessionid=abc; path=/'})
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/id/player/badges/', body='', status=404)
+        swb = SteamWebBrowser('user', 'password')
+        recorder = Recorder()
+        metrics = MetricsAggregator([('badges', r'/badges/$'), ('profile', r'/id/[^/]+$')])
+        swb.add_instrument(recorder)
+        swb.add_instrument(metrics)
+
+        swb.get('https://steamcommunity.com/id/player')
+        with self.assertRaises(HTTPError):
+            swb.get('https://steamcommunity.com/id/player/badges/')
+
+        self.assertEqual(recorder.before, recorder.after)
+        profile, badges = recorder.after
+        self.assertEqual((profile.status_code, profile.size, profile.cookies_saved), (200, 7, True))
+        self.assertIn('save_cookies', profile.timings)
+        self.assertGreaterEqual(profile.timings['total'], profile.timings['response'])
+        self.assertEqual(badges.status_code, 404)
+        self.assertIsInstance(badges.error, HTTPError)
+
+        text = prometheus_text(metrics)
+        self.assertIn('steamweb_requests_total{method="GET",pattern="profile",status="200"} 1\n', text)
+        self.assertIn('steamweb_requests_total{method="GET",pattern="badges",status="404"} 1\n', text)
+        self.assertIn('steamweb_request_duration_seconds_count{method="GET",pattern="profile"} 1\n', text)
+        self.assertIn('steamweb_request_duration_seconds_bucket{le="+Inf",method="GET",pattern="badges"} 1\n',
+                      text)
+        self.assertIn('steamweb_response_bytes_total{method="GET",pattern="profile"} 7\n', text)
+        self.assertIn('steamweb_cookie_saves_total{method="GET",pattern="profile"} 1\n', text)
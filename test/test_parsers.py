@@ -0,0 +1,124 @@
+import unittest
+from datetime import datetime
+
+from steamweb import parsers
+
+PROFILE = '''
+<div class="persona_level"><div class="friendPlayerLevel lvl_10"><span class="friendPlayerLevelNum">12</span></div></div>
+<div class="profile_ban_status">
+    <div class="profile_ban">
+        2 VAC ban(s) on record
+        <span class="profile_ban_info">| <a class="whiteLink" href="https://steamcommunity.com/actions/WhatIsVAC">Info</a></span>
+    </div>
+    316 day(s) since last ban
+</div>
+<div class="profile_item_links">
+    <a href="https://steamcommunity.com/id/player/badges/">
+        <span class="count_link_label">Badges</span>&nbsp;
+        <span class="profile_count_link_total">
+            7
+        </span>
+    </a>
+    <a href="https://steamcommunity.com/id/player/games/?tab=all">
+        <span class="count_link_label">Games</span>&nbsp;
+        <span class="profile_count_link_total">
+            1,024
+        </span>
+    </a>
+    <a href="https://steamcommunity.com/id/player/friends/">
+        <span class="count_link_label">Friends</span>&nbsp;
+        <span class="profile_count_link_total">
+            42
+        </span>
+    </a>
+</div>
+'''
+
+BADGE = '''
+<div class="badge_info_image">
+    <img src="https://steamcommunity-a.akamaihd.net/public/shared/images/trans.gif" id="delayedimage_%(id)s_0">
+</div>
+<div class="badge_info_description">
+    <div class="badge_info_title">%(name)s</div>
+    <div>
+        %(level)s %(xp)s XP
+    </div>
+    <div class="badge_info_unlocked">
+        Unlocked %(date)s
+    </div>
+</div>
+'''
+
+BADGES = (
+    BADGE % {'id': 'badge_1', 'name': 'Years of Service', 'level': 'Level 5,', 'xp': 250, 'date': 'Jan 2, 2015 @ 1:02pm'} +
+    BADGE % {'id': 'badge_2', 'name': 'Pillar of Community', 'level': '', 'xp': 100, 'date': 'Mar 3 @ 9:30am'} +
+    '<script>g_rgDelayedLoadImages={"badge_1":["https:\\/\\/example.com\\/1.png"],"badge_2":["https:\\/\\/example.com\\/2.png"]};</script>'
+)
+
+ACHIEVEMENTS = '''
+<div class="achievePercent">91.4%</div>
+<div class="achieveTxt">
+    <h3>Head of the Class</h3>
+    <h5>Play a complete round with every class.</h5>
+</div>
+'''
+
+PLAYER_ACHIEVEMENTS = '''
+<div class="achieveUnlockTime">
+    Unlocked Jul 4, 2014 @ 10:01pm<br />
+</div>
+<h3 class="ellipsis">Head of the Class</h3>
+<h5>Play a complete round with every class.</h5>
+'''
+
+FRIENDS = '''
+<div class="friendBlock"><a class="friendBlockLinkOverlay" href="https://steamcommunity.com/id/friend1"></a></div>
+<div class="friendBlock"><a class="friendBlockLinkOverlay" href="http://steamcommunity.com/profiles/76561197960287930"></a></div>
+'''
+
+PLAYERS = '''
+<a href="https://steamcommunity.com/id/me" data-miniprofile="123">Me &amp; myself</a>
+<div class="friendBlock"><a class="friendBlockLinkOverlay" href="https://steamcommunity.com/id/player1"></a>
+    <div class="friendBlockContent"><div>
+        Player &lt;1&gt;<br />
+    </div></div>
+</div>
+'''
+
+GAMES = '''<script>
+var rgGames = [{"appid":440,"name":"Team Fortress 2","hours_forever":"1,234.5"},{"appid":570,"name":"Dota 2"}];
+var rgChangingGames = [];
+</script>'''
+
+class TestParsers(unittest.TestCase):
+    today = datetime(2016, 6, 1)
+
+    def test_profile(self):
+        profile = parsers.parse_profile(PROFILE)
+        self.assertEqual(profile, parsers.ProfileInfo(
+            private=False, level=12, counts={'Badges': 7, 'Games': 1024, 'Friends': 42},
+            vac_bans=2, vac_ban_days=316))
+        self.assertTrue(parsers.parse_profile('<div class="private_profile">').private)
+
+    def test_badges(self):
+        badges = parsers.parse_badges(BADGES, self.today)
+        self.assertEqual(badges, [
+            parsers.Badge('Years of Service', 'https://example.com/1.png', 5, 250, datetime(2015, 1, 2, 13, 2)),
+            parsers.Badge('Pillar of Community', 'https://example.com/2.png', None, 100, datetime(2016, 3, 3, 9, 30)),
+        ])
+
+    def test_achievements(self):
+        self.assertEqual(parsers.parse_achievements(ACHIEVEMENTS), [
+            parsers.Achievement('Head of the Class', 'Play a complete round with every class.', 91.4)])
+        self.assertEqual(parsers.parse_player_achievements(PLAYER_ACHIEVEMENTS), [
+            parsers.PlayerAchievement('Head of the Class', 'Play a complete round with every class.',
+                                      datetime(2014, 7, 4, 22, 1))])
+
+    def test_friends(self):
+        self.assertEqual(parsers.parse_friends(FRIENDS), ['id/friend1', 'profiles/76561197960287930'])
+        self.assertEqual(parsers.parse_concurrent_players(PLAYERS), [
+            parsers.Player('id/player1', 'Player <1>'), parsers.Player('id/me', 'Me & myself')])
+
+    def test_games(self):
+        self.assertEqual(parsers.parse_games(GAMES), [
+            parsers.Game(440, 'Team Fortress 2', 1234.5), parsers.Game(570, 'Dota 2', 0.0)])
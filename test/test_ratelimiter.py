@@ -0,0 +1,44 @@
+import unittest
+import httpretty
+import mock
+from requests import Session
+
+from steamweb.ratelimiter import RateLimiter, RateLimitedAdapter, parse_retry_after
+
+class TestRateLimiter(unittest.TestCase):
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('3'), 3.0)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:10 GMT', now=1445412480), 10.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+
+    @mock.patch('time.time', return_value=1000.0)
+    def test_bucket(self, _):
+        limiter = RateLimiter(rate=2.0, burst=2, min_rate=0.5, increase=1.0)
+        # Burst, then one request every 1 / rate seconds
+        self.assertEqual([limiter.reserve('a') for _ in range(4)], [0, 0, 0.5, 1.0])
+        # Hosts have their own buckets
+        self.assertEqual(limiter.reserve('b'), 0)
+
+        limiter.throttled('a', retry_after=10)
+        self.assertEqual(limiter.rate('a'), 1.0)
+        self.assertEqual(limiter.reserve('a'), 10 + 3.0)
+        limiter.throttled('a')
+        limiter.throttled('a')
+        self.assertEqual(limiter.rate('a'), 0.5)
+        limiter.succeeded('a')
+        self.assertEqual(limiter.rate('a'), 2.5)
+
+    @httpretty.activate
+    def test_adapter(self):
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/', responses=[
+            httpretty.Response(body='slow down', status=429, adding_headers={'Retry-After': '0'}),
+            httpretty.Response(body='ok', status=200),
+        ])
+        limiter = RateLimiter(rate=100.0)
+        session = Session()
+        session.mount('https://', RateLimitedAdapter(limiter))
+        r = session.get('https://steamcommunity.com/')
+        self.assertEqual(r.text, 'ok')
+        self.assertEqual(limiter.throttled_count, 1)
+        self.assertLess(limiter.rate('steamcommunity.com'), 100.0)
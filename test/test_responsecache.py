@@ -0,0 +1,81 @@
+import os
+import shutil
+import unittest
+import tempfile
+import httpretty
+from requests import Response
+
+from steamweb.steamwebbrowser import SteamWebBrowser
+from steamweb.responsecache import ResponseCache
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        os.environ['STEAMWEBROWSER_HOME'] = self.temp_dir
+        self.url = 'https://steamcommunity.com/stats/440/achievements/'
+        self.ttls = [(r'/stats/\d+/achievements/', 3600)]
+
+    def tearDown(self):
+        if os.path.isdir(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+
+    @httpretty.activate
+    def test_cache(self):
+        httpretty.register_uri(httpretty.GET, self.url, responses=[
+            httpretty.Response(body='first'),
+            httpretty.Response(body='second'),
+            httpretty.Response(body='third'),
+        ])
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/uncached', body='uncached')
+        swb = SteamWebBrowser('user', 'password')
+        cache = swb.enable_response_cache(self.ttls)
+        self.assertEqual(swb.get(self.url).text, 'first')
+        self.assertEqual(swb.get(self.url).text, 'first')
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(swb.get(self.url, force_refresh=True).text, 'second')
+        self.assertEqual(swb.get(self.url).text, 'second')
+        # URLs not matching a pattern are not counted
+        swb.get('https://steamcommunity.com/uncached')
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+        # Another account sharing the cache does not get cached responses
+        other = SteamWebBrowser('other', 'password')
+        other.response_cache = cache
+        self.assertEqual(other.get(self.url).text, 'third')
+
+    def test_lru_and_persistence(self):
+        path = os.path.join(self.temp_dir, 'cache')
+        cache = ResponseCache(self.ttls, maxsize=1, path=path)
+        for params, content in ((None, b'achievements'), ({'l': 'german'}, b'errungenschaften')):
+            r = Response()
+            r.status_code = 200
+            r.url = self.url
+            r.encoding = 'utf-8'
+            r._content = content
+            cache.set(cache.key('user', self.url, params), self.url, r)
+        # Only the last one is kept in memory
+        self.assertEqual(len(cache._entries), 1)
+        # A new cache (e.g. after restart) reads from disk
+        cache = ResponseCache(self.ttls, path=path)
+        self.assertEqual(cache.get(cache.key('user', self.url), self.url).text, 'achievements')
+        self.assertEqual(cache.get(cache.key('user', self.url, {'l': 'german'}), self.url).text, 'errungenschaften')
+        self.assertIsNone(cache.get(cache.key('other', self.url), self.url))
+
+    @httpretty.activate
+    def test_conditional_request(self):
+        url = 'https://steamcommunity.com/id/player/friends'
+        def friends(request, uri, headers):
+            if request.headers.get('If-None-Match') == '"v1"':
+                return (304, {'ETag': '"v1"'}, '')
+            headers['ETag'] = '"v1"'
+            return (200, headers, 'friends')
+        httpretty.register_uri(httpretty.GET, url, body=friends)
+        swb = SteamWebBrowser('user', 'password')
+        # Always revalidate
+        cache = swb.enable_response_cache([('/friends', 0)])
+        self.assertEqual(swb.get(url).text, 'friends')
+        r = swb.get(url)
+        self.assertEqual(httpretty.last_request().headers.get('If-None-Match'), '"v1"')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.text, 'friends')
+        self.assertEqual((cache.hits, cache.misses, cache.revalidations), (0, 2, 1))
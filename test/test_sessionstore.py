@@ -0,0 +1,71 @@
+import os
+import shutil
+import unittest
+import tempfile
+from sys import version_info
+if version_info.major >= 3:
+    from http.cookiejar import Cookie
+else:
+    from cookielib import Cookie
+
+from steamweb.steamwebbrowser import SteamWebBrowser
+from steamweb.sessionstore import SQLiteSessionStore
+
+def session_cookie(value):
+    return Cookie(version=0, name='sessionid', value=value,
+        port=None, port_specified=False,
+        domain='steamcommunity.com', domain_specified=True, domain_initial_dot=False,
+        path='/', path_specified=True,
+        secure=False, expires=None, discard=False, comment=None, comment_url=None, rest={},
+    )
+
+class TestSQLiteSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        os.environ['STEAMWEBROWSER_HOME'] = self.temp_dir
+        self.store = SQLiteSessionStore(os.path.join(self.temp_dir, 'sessions.sqlite'))
+
+    def tearDown(self):
+        self.store.close()
+        if os.path.isdir(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+
+    def test_migrate(self):
+        swb = SteamWebBrowser('user', 'password')
+        swb._store_oauth_access_token('token')
+        cookie_file = swb.session.cookies.filename
+        swb.close()
+
+        swb = SteamWebBrowser('user', 'password', session_store=self.store)
+        self.assertFalse(os.path.exists(cookie_file))
+        self.assertTrue(os.path.exists(cookie_file + '.migrated'))
+        self.assertEqual(swb.oauth_access_token, 'token')
+        self.assertTrue(swb._has_cookie('forceMobile'))
+        self.assertEqual(self.store.tokens('user'), ('token', None))
+        self.assertEqual(self.store.accounts(), ['user'])
+
+    def test_save(self):
+        swb1 = SteamWebBrowser('user', 'password', session_store=self.store)
+        version = self.store.version('user')
+        swb2 = SteamWebBrowser('user', 'password', session_store=self.store)
+        self.assertFalse(swb2.session.cookies.changed_on_disk)
+
+        swb1.session.cookies.set_cookie(session_cookie('1'))
+        swb1.flush_cookies()
+        self.assertEqual(self.store.version('user'), version + 1)
+        self.assertFalse(swb1.session.cookies.changed_on_disk)
+        self.assertTrue(swb2.session.cookies.changed_on_disk)
+
+        # Only changed cookies are written, other rows are kept
+        swb2.session.cookies.set_cookie(session_cookie('2'))
+        swb2._store_steamid('123')
+        swb2.flush_cookies()
+        swb1.session.cookies.reload(ignore_discard=True)
+        self.assertEqual(swb1._get_cookie('sessionid', 'steamcommunity.com').value, '2')
+        self.assertEqual(swb1.steamid, '123')
+
+        swb1.session.cookies.clear('steamcommunity.com', '/', 'sessionid')
+        swb1.flush_cookies()
+        version, cookies = self.store.load('user')
+        self.assertNotIn('sessionid', [c.name for c in cookies])
+        self.assertIn('forceMobile', [c.name for c in cookies])
@@ -0,0 +1,66 @@
+import unittest
+import mock
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import smurf
+from steamweb.parsers import ProfileInfo, Badge
+
+PROFILES = {
+    'id/private': ProfileInfo(True, None, {}, 0, None),
+    'id/public': ProfileInfo(False, 10, {'Friends': 20, 'Games': 15}, 0, None),
+}
+BADGES = {'Years of Service': Badge('Years of Service', 'image', None, 100, datetime(2015, 1, 2))}
+
+class StubBrowser(object):
+    ''' Stands in for a SteamWebBrowser, the fetch functions of smurf are patched '''
+    def __init__(self, failing=()):
+        self.failing = failing
+
+    def fetch(self, field, player, result):
+        if player == 'id/private' and field != 'profile':
+            # Badges and games of private profiles are not visible
+            raise ValueError('Private profile')
+        if (player, field) in self.failing:
+            raise IOError('Request failed')
+        return result
+
+def get_profile_info(swb, player):
+    return swb.fetch('profile', player, PROFILES[player])
+
+def get_badges(swb, player):
+    return swb.fetch('badges', player, BADGES)
+
+def get_total_hours(swb, player):
+    return swb.fetch('total_hours', player, 100.0)
+
+@mock.patch.object(smurf, 'get_profile_info', get_profile_info)
+@mock.patch.object(smurf, 'get_badges', get_badges)
+@mock.patch.object(smurf, 'get_total_hours', get_total_hours)
+class TestIterDossiers(unittest.TestCase):
+    players = ['id/private', 'id/public']
+    names = {'id/private': 'Private', 'id/public': 'Public'}
+
+    def test_dossiers(self):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            dossiers = dict((d.player, d) for d in smurf.iter_dossiers(StubBrowser(), self.players, self.names, executor))
+        self.assertEqual(sorted(dossiers), self.players)
+
+        # Failed fetches of the private profile are cancelled or ignored
+        private = dossiers['id/private']
+        self.assertTrue(private.complete)
+        self.assertIsNone(private.badges)
+        self.assertIsNone(private.total_hours)
+        self.assertTrue(private.score()['Private'])
+
+        public = dossiers['id/public']
+        self.assertEqual(public.badges, BADGES)
+        self.assertEqual(public.total_hours, 100.0)
+        self.assertEqual(public.errors, {})
+        self.assertEqual(public.score()['Name'], 'Public')
+
+    def test_failed_fetch(self):
+        swb = StubBrowser(failing=[('id/public', 'badges')])
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with self.assertRaises(IOError):
+                list(smurf.iter_dossiers(swb, self.players, self.names, executor))
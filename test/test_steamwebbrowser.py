@@ -8,14 +8,21 @@ import datetime
 import random
 import string
 import mock
+import time
+from threading import Thread
 from sys import version_info
 from Crypto.PublicKey import RSA
 from Crypto.Cipher import PKCS1_v1_5
-from base64 import b64decode
+from base64 import b64decode, urlsafe_b64encode
 from png import Writer
 from io import BytesIO
+if version_info.major >= 3:
+    from http.cookiejar import Cookie
+else:
+    from cookielib import Cookie
 
-from steamweb.steamwebbrowser import SteamWebBrowser, SteamWebError, IncorrectLoginError
+from steamweb.steamwebbrowser import SteamWebBrowser, SteamWebError, IncorrectLoginError, SteamCookieJar, LoginFailedError
+from steamweb.steamwebbrowser import LoginChallenge, NoEmailCodeError
 
 def random_ascii_string(lengh):
     ''' Return a random string
@@ -143,6 +150,7 @@ class TestSteamWebBrowser(unittest.TestCase):
     def setUp(self):
         self.temp_dir = tempfile.mkdtemp()
         os.environ['STEAMWEBROWSER_HOME'] = self.temp_dir
+        SteamWebBrowser._rsa_keys.clear()
 
     def tearDown(self):
         if os.path.isdir(self.temp_dir):
@@ -208,6 +216,37 @@ class TestSteamWebBrowser(unittest.TestCase):
             # Test if cookies where stored
             self.assertTrue(swb._has_cookie('browserid'))
     
+    @httpretty.activate
+    def test_start_login(self):
+        swb = SteamWebBrowserMocked('user', 'password')
+        with mock.patch.object(swb, '_handle_emailauth') as handler:
+            challenge = swb.start_login()
+            self.assertEqual(challenge.kind, 'emailauth')
+            self.assertEqual(challenge.maildomain, 'whoooohooo.com')
+            with self.assertRaises(NoEmailCodeError):
+                swb.resume_login(challenge)
+            challenge = swb.resume_login(challenge.solve('code'))
+            self.assertEqual(challenge.kind, 'twofactor')
+            challenge = swb.resume_login(challenge.solve('code'))
+            self.assertEqual(challenge.kind, 'captcha')
+            self.assertTrue(challenge.image.startswith(b'\x89PNG'))
+            self.assertEqual(swb.resume_login(challenge.solve('code')), swb._steamid)
+            # Handlers are never asked
+            self.assertEqual(handler.call_count, 0)
+
+    @httpretty.activate
+    def test_login_challenge_solver(self):
+        swb = SteamWebBrowserMocked('user', 'password')
+        challenges = []
+
+        def solver(challenge):
+            self.assertIsInstance(challenge, LoginChallenge)
+            challenges.append(challenge.kind)
+            return 'code'
+        swb.challenge_solver = solver
+        self.assertEqual(swb.login(), swb._steamid)
+        self.assertEqual(challenges, ['emailauth', 'twofactor', 'captcha'])
+
     @httpretty.activate
     def test_login_failed(self):
         swb = SteamWebBrowserMocked('user', 'password')
@@ -215,3 +254,373 @@ class TestSteamWebBrowser(unittest.TestCase):
                                 body='{"success": false,"message":"Incorrect login."}')
         with self.assertRaises(IncorrectLoginError):
             swb.login()
+
+    def test_cookie_generation(self):
+        jar = SteamCookieJar()
+        cookie = SteamWebBrowser.mobile_cookies[0]
+        jar.set_cookie(cookie)
+        generation = jar.generation
+        # Setting the very same cookie again is no change
+        jar.set_cookie(cookie)
+        self.assertEqual(jar.generation, generation)
+        jar.clear(cookie.domain, cookie.path, cookie.name)
+        self.assertNotEqual(jar.generation, generation)
+
+    @httpretty.activate
+    def test_save_cookies_on_change(self):
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/nocookie', body='')
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/cookie', body='',
+                                adding_headers={'Set-Cookie': 'sessionid=abc; path=/'})
+        swb = SteamWebBrowser('user', 'password')
+        with mock.patch.object(swb, '_save_cookies') as save_cookies:
+            swb.get('https://steamcommunity.com/nocookie')
+            self.assertFalse(save_cookies.called)
+            swb.get('https://steamcommunity.com/cookie')
+            self.assertTrue(save_cookies.called)
+
+    @httpretty.activate
+    def test_save_interval(self):
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/cookie', body='',
+                                adding_headers={'Set-Cookie': 'sessionid=abc; path=/'})
+        swb = SteamWebBrowser('user', 'password', save_interval=3600)
+        # Cookie file has been created right away
+        self.assertTrue(os.path.isfile(swb.session.cookies.filename))
+        swb.get('https://steamcommunity.com/cookie')
+        self.assertTrue(swb.session.cookies.changed)
+        self.assertIsNotNone(swb._save_timer)
+        swb.close()
+        self.assertFalse(swb.session.cookies.changed)
+        self.assertIsNone(swb._save_timer)
+        with open(swb.session.cookies.filename) as f:
+            self.assertIn('sessionid', f.read())
+
+    @httpretty.activate
+    def test_get_many_relogin_once(self):
+        def page(request, uri, headers):
+            if 'steamLogin=' not in request.headers.get('Cookie', ''):
+                return (302, {'Location': 'https://steamcommunity.com/login/home/?goto=page'}, '')
+            return (200, headers, uri)
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/login/home/', body='login')
+        urls = ['https://steamcommunity.com/page/%d' % i for i in range(10)]
+        for url in urls:
+            httpretty.register_uri(httpretty.GET, url, body=page)
+        swb = SteamWebBrowser('user', 'password')
+
+        def login():
+            swb.session.cookies.set_cookie(Cookie(version=0, name='steamLogin', value='1',
+                port=None, port_specified=False,
+                domain='steamcommunity.com', domain_specified=True, domain_initial_dot=False,
+                path='/', path_specified=True,
+                secure=False, expires=None, discard=False, comment=None, comment_url=None, rest={},
+            ))
+            swb._login_count += 1
+            return '1'
+
+        with mock.patch.object(swb, 'login', side_effect=login) as mock_login:
+            results = list(swb.get_many(urls, max_workers=5))
+            self.assertEqual([url for url, r in results], urls)
+            self.assertEqual([r.text for url, r in results], urls)
+            self.assertEqual(mock_login.call_count, 1)
+
+    @httpretty.activate
+    def test_relogin_retry_once(self):
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/login/home/', body='login')
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/page', status=302,
+                                location='https://steamcommunity.com/login/home/?goto=page')
+        swb = SteamWebBrowser('user', 'password')
+
+        def login(*args):
+            swb._login_count += 1
+            return '1'
+
+        # A session that expires right after login must not lead to endless logins
+        with mock.patch.object(swb, '_login', side_effect=login) as mock_login:
+            self.assertIsNone(swb.get('https://steamcommunity.com/page'))
+            self.assertEqual(mock_login.call_count, 1)
+
+    @httpretty.activate
+    def test_relogin_refresh_session(self):
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/login/home/', body='login')
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/page', responses=[
+            httpretty.Response(body='', status=302, location='https://steamcommunity.com/login/home/?goto=page'),
+            httpretty.Response(body='page'),
+        ])
+        httpretty.register_uri(httpretty.POST, SteamWebBrowser.wgtoken_url, body=json.dumps(
+            {'response': {'token': 'ABC', 'token_secure': 'DEF'}}))
+        swb = SteamWebBrowser('user', 'password')
+        swb._store_oauth_access_token('token')
+        swb._store_steamid('123')
+
+        # The stored token renews the session without a login
+        with mock.patch.object(swb, '_login') as mock_login:
+            self.assertEqual(swb.get('https://steamcommunity.com/page').text, 'page')
+            self.assertEqual(mock_login.call_count, 0)
+        self.assertEqual(swb._get_cookie('steamLoginSecure', 'steamcommunity.com').value, '123%7C%7CDEF')
+        self.assertEqual(swb._get_cookie('steamLogin', 'store.steampowered.com').value, '123%7C%7CABC')
+
+    @httpretty.activate
+    def test_relogin_refresh_session_rejected(self):
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/login/home/', body='login')
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/page', responses=[
+            httpretty.Response(body='', status=302, location='https://steamcommunity.com/login/home/?goto=page'),
+            httpretty.Response(body='page'),
+        ])
+        httpretty.register_uri(httpretty.POST, SteamWebBrowser.wgtoken_url, status=401, body='')
+        swb = SteamWebBrowser('user', 'password')
+        swb._store_oauth_access_token('token')
+        swb._store_steamid('123')
+
+        def login(*args):
+            swb._login_count += 1
+            return '123'
+
+        with mock.patch.object(swb, '_login', side_effect=login) as mock_login:
+            self.assertEqual(swb.get('https://steamcommunity.com/page').text, 'page')
+            self.assertEqual(mock_login.call_count, 1)
+
+    @httpretty.activate
+    def test_relogin_early_expiry_detection(self):
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/login/home/', body='login')
+        httpretty.register_uri(httpretty.POST, 'https://steamcommunity.com/page', responses=[
+            httpretty.Response(body='', status=302, location='https://steamcommunity.com/login/home/?goto=page'),
+            httpretty.Response(body='', status=302, location='/done'),
+        ])
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/done', body='done')
+        swb = SteamWebBrowser('user', 'password')
+
+        def login(*args):
+            swb._login_count += 1
+            return '1'
+
+        with mock.patch.object(swb, '_login', side_effect=login) as mock_login:
+            r = swb.post('https://steamcommunity.com/page', data={'key': 'value'})
+            self.assertEqual(mock_login.call_count, 1)
+        # The login page is never downloaded, other redirects are followed
+        self.assertNotIn('/login/home/', [req.path.split('?')[0] for req in httpretty.latest_requests()])
+        self.assertEqual((httpretty.last_request().method, httpretty.last_request().path), ('GET', '/done'))
+        self.assertEqual(r.text, 'done')
+        self.assertEqual(r.url, 'https://steamcommunity.com/done')
+        self.assertEqual([h.status_code for h in r.history], [302])
+
+    @httpretty.activate
+    def test_early_expiry_detection_redirect(self):
+        httpretty.register_uri(httpretty.POST, 'https://steamcommunity.com/page',
+            body='', status=302, location='https://store.steampowered.com/done')
+        httpretty.register_uri(httpretty.GET, 'https://store.steampowered.com/done', body='done')
+        swb = SteamWebBrowser('user', 'password')
+        r = swb.post('https://steamcommunity.com/page', json={'key': 'value'}, headers={'Authorization': 'secret'})
+        # Redirected like requests does: as GET without the body and no credentials for other hosts
+        self.assertEqual(r.text, 'done')
+        self.assertEqual([h.status_code for h in r.history], [302])
+        self.assertEqual(httpretty.last_request().method, 'GET')
+        self.assertEqual(httpretty.last_request().body, b'')
+        self.assertNotIn('Content-Type', httpretty.last_request().headers)
+        self.assertNotIn('Authorization', httpretty.last_request().headers)
+
+    def login_secure_cookie(self, value, domain='steamcommunity.com'):
+        return Cookie(version=0, name='steamLoginSecure', value=value,
+            port=None, port_specified=False,
+            domain=domain, domain_specified=True, domain_initial_dot=False,
+            path='/', path_specified=True,
+            secure=True, expires=None, discard=False, comment=None, comment_url=None, rest={},
+        )
+
+    def test_session_expires(self):
+        swb = SteamWebBrowser('user', 'password')
+        self.assertIsNone(swb.session_expires())
+        swb._session_started = 1000
+        self.assertEqual(swb.session_expires(), 1000 + swb.session_lifetime)
+        # The token is a JWT with the expiry in its payload
+        payload = urlsafe_b64encode(json.dumps({'exp': 1234567890}).encode('ascii')).decode('ascii').rstrip('=')
+        swb.session.cookies.set_cookie(self.login_secure_cookie('123%7C%7Cheader.' + payload + '.signature'))
+        self.assertEqual(swb.session_expires(), 1234567890)
+
+    @httpretty.activate
+    def test_session_refresh(self):
+        httpretty.register_uri(httpretty.POST, SteamWebBrowser.wgtoken_url, body=json.dumps(
+            {'response': {'token': 'ABC', 'token_secure': 'DEF'}}))
+        swb = SteamWebBrowser('user', 'password')
+        swb._store_oauth_access_token('token')
+        swb._store_steamid('123')
+        swb.token_refresh_interval = 0
+        payload = urlsafe_b64encode(json.dumps({'exp': int(time.time()) + 60}).encode('ascii')).decode('ascii')
+        swb.session.cookies.set_cookie(self.login_secure_cookie('123%7C%7Cheader.' + payload + '.signature'))
+
+        # Expires within the margin, renewed right away in the background
+        with mock.patch.object(swb, '_login') as mock_login:
+            swb.enable_session_refresh(margin=600)
+            for _ in range(100):
+                if swb._login_count:
+                    break
+                time.sleep(0.02)
+            swb.close()
+            self.assertEqual(mock_login.call_count, 0)
+        self.assertEqual(swb._login_count, 1)
+        self.assertEqual(swb._get_cookie('steamLoginSecure', 'steamcommunity.com').value, '123%7C%7CDEF')
+        self.assertIsNone(swb._refresh_timer)
+
+    @httpretty.activate
+    def test_session_refresh_without_login(self):
+        httpretty.register_uri(httpretty.POST, SteamWebBrowser.wgtoken_url, status=401, body='')
+        swb = SteamWebBrowser('user', 'password')
+        swb._store_oauth_access_token('token')
+        swb._store_steamid('123')
+        swb.session_refresh_margin = 600
+        swb._session_started = time.time() - swb.session_lifetime
+
+        # The token is rejected, the background thread must not wait for login challenges
+        with mock.patch.object(swb, '_login') as mock_login:
+            swb._refresh_session_ahead()
+            self.assertEqual(mock_login.call_count, 0)
+            self.assertEqual(httpretty.last_request().path, '/IMobileAuthService/GetWGToken/v0001')
+            # Unless they are solved without blocking
+            swb.challenge_solver = lambda challenge: 'code'
+            swb._token_refreshed = 0
+            swb._refresh_session_ahead()
+            self.assertEqual(mock_login.call_count, 1)
+        swb.close()
+
+    def test_login_serialized(self):
+        swb = SteamWebBrowser('user', 'password')
+        active = []
+
+        def login(*args):
+            active.append(1)
+            self.assertEqual(len(active), 1)
+            time.sleep(0.05)
+            active.pop()
+            return '1'
+
+        with mock.patch.object(swb, '_login', side_effect=login) as mock_login:
+            threads = [Thread(target=swb.login) for i in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(mock_login.call_count, 4)
+
+    @httpretty.activate
+    def test_logged_in(self):
+        swb = SteamWebBrowser('user', 'password')
+        swb._store_oauth_access_token('token')
+        # No login cookie, no need to ask Steam
+        self.assertFalse(swb.logged_in())
+        self.assertIsNone(httpretty.last_request().method)
+
+        swb.session.cookies.set_cookie(Cookie(version=0, name='steamLoginSecure', value='1',
+            port=None, port_specified=False,
+            domain='steamcommunity.com', domain_specified=True, domain_initial_dot=False,
+            path='/', path_specified=True,
+            secure=True, expires=None, discard=False, comment=None, comment_url=None, rest={},
+        ))
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/my/', status=302,
+                                location='https://steamcommunity.com/login/home/?goto=%2Fmy%2F')
+        self.assertFalse(swb.logged_in())
+
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/my/', status=302,
+                                location='https://steamcommunity.com/id/user/')
+        self.assertTrue(swb.logged_in())
+        # Cached
+        httpretty.reset()
+        self.assertTrue(swb.logged_in())
+
+    def test_relogin_other_process(self):
+        # Two browsers of the same user share the cookie file like two processes would
+        swb1 = SteamWebBrowser('user', 'password')
+        swb2 = SteamWebBrowser('user', 'password')
+        swb1._store_oauth_access_token('token')
+        swb1.session.cookies.set_cookie(Cookie(version=0, name='steamLoginSecure', value='1',
+            port=None, port_specified=False,
+            domain='steamcommunity.com', domain_specified=True, domain_initial_dot=False,
+            path='/', path_specified=True,
+            secure=True, expires=None, discard=False, comment=None, comment_url=None, rest={},
+        ))
+        swb1.flush_cookies()
+        swb2.session.cookies.set_cookie(Cookie(version=0, name='sessionid', value='2',
+            port=None, port_specified=False,
+            domain='steamcommunity.com', domain_specified=True, domain_initial_dot=False,
+            path='/', path_specified=True,
+            secure=False, expires=None, discard=False, comment=None, comment_url=None, rest={},
+        ))
+
+        # swb2 takes the login of swb1 instead of logging in itself
+        with mock.patch.object(swb2, 'login') as login:
+            self.assertTrue(swb2._relogin(swb2._login_count))
+            self.assertFalse(login.called)
+        self.assertEqual(swb2._login_cookie_values(), ['1'])
+        self.assertEqual(swb2.oauth_access_token, 'token')
+        # Own changes have been merged into the file
+        with open(swb2.session.cookies.filename) as f:
+            content = f.read()
+        self.assertIn('steamLoginSecure', content)
+        self.assertIn('sessionid', content)
+
+        # No new login on disk
+        with mock.patch.object(swb2, 'login', return_value='1') as login:
+            swb2._relogin(swb2._login_count)
+            self.assertTrue(login.called)
+
+    @httpretty.activate
+    def test_rsa_key_cached(self):
+        swb = SteamWebBrowserMocked('user', 'password')
+        swb._login_stage = ['email', 'twocfactor']
+        with mock.patch.object(SteamWebBrowser, '_get_rsa_key', autospec=True,
+                                side_effect=SteamWebBrowser._get_rsa_key) as get_rsa_key:
+            with mock.patch.object(swb, '_handle_emailauth', return_value='code'), \
+                    mock.patch.object(swb, '_handle_twofactor', return_value='code'):
+                swb.login()
+            # One key for all login steps
+            self.assertEqual(get_rsa_key.call_count, 1)
+
+            # Shared with other instances of the same user
+            httpretty.reset()
+            httpretty.register_uri(httpretty.POST, 'https://steamcommunity.com/mobilelogin/getrsakey/',
+                                    body=json.dumps({
+                                            'success': True,
+                                            'publickey_mod': format(swb.rsa_full.n, 'x').upper(),
+                                            'publickey_exp': format(swb.rsa_full.e, 'x').upper(),
+                                            'timestamp': '64861350000',
+                                    }))
+            httpretty.register_uri(httpretty.POST, 'https://steamcommunity.com/mobilelogin/dologin/',
+                                    body='{"success": false}')
+            swb2 = SteamWebBrowser('user', 'password')
+            with self.assertRaises(LoginFailedError):
+                swb2.login()
+            # Retried once with a new key
+            self.assertEqual(get_rsa_key.call_count, 2)
+
+    @httpretty.activate
+    def test_iter_json_array(self):
+        games = [{'appid': i, 'name': 'Game \\/ %d' % i, 'hours_forever': '1,%03d.5' % i} for i in range(50)]
+        body = '<html><script>\nvar rgGames = %s;\nvar rgChangingGames = [];\n</script>' % json.dumps(games)
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/id/player/games/', body=body)
+        swb = SteamWebBrowser('user', 'password')
+        for chunk_size in (1, 7, 16384):
+            self.assertEqual(list(swb.iter_json_array('https://steamcommunity.com/id/player/games/',
+                                                    'var rgGames = ', chunk_size=chunk_size)), games)
+        self.assertEqual(list(swb.iter_json_array('https://steamcommunity.com/id/player/games/',
+                                                'var rgChangingGames = ')), [])
+        with self.assertRaises(SteamWebError):
+            list(swb.iter_json_array('https://steamcommunity.com/id/player/games/', 'var rgNothing = '))
+
+    @httpretty.activate
+    def test_iter_json_array_numbers(self):
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/numbers',
+                               body='var x = [1.5, 2e3, -7, 10, {"a": 1}, 0.25E-1];')
+        swb = SteamWebBrowser('user', 'password')
+        # Chunk boundaries within numbers
+        for chunk_size in range(1, 20):
+            self.assertEqual(list(swb.iter_json_array('https://steamcommunity.com/numbers', 'var x = ',
+                                                      chunk_size=chunk_size)),
+                             [1.5, 2e3, -7, 10, {'a': 1}, 0.025])
+
+    @httpretty.activate
+    def test_iter_json_array_not_found(self):
+        # The end of the page looks like an array but the marker is missing
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/short', body='[1, 2]')
+        swb = SteamWebBrowser('user', 'password')
+        with self.assertRaises(SteamWebError):
+            list(swb.iter_json_array('https://steamcommunity.com/short', 'var rgGames = '))
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/short', body='var rgGames = [1, 2.')
+        with self.assertRaises(SteamWebError):
+            list(swb.iter_json_array('https://steamcommunity.com/short', 'var rgGames = '))
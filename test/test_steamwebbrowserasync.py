@@ -0,0 +1,124 @@
+import os
+import shutil
+import unittest
+import tempfile
+import json
+import asyncio
+from Crypto.PublicKey import RSA
+
+try:
+    from aiohttp import web
+    from steamweb.steamwebbrowserasync import AsyncSteamWebBrowser
+except ImportError:
+    web = None
+
+@unittest.skipIf(web is None, 'aiohttp is not installed')
+class TestAsyncSteamWebBrowser(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        os.environ['STEAMWEBROWSER_HOME'] = self.temp_dir
+        self.loop = asyncio.new_event_loop()
+        self.logins = 0
+        self.page_requests = 0
+        self.game_list = [{'appid': i, 'hours_forever': '%d.5' % i} for i in range(100)] + [1.5, 2e3]
+        self.rsa_full = RSA.generate(1024)
+
+    def tearDown(self):
+        self.loop.close()
+        if os.path.isdir(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+
+    async def getrsakey(self, request):
+        return web.json_response({
+            'success': True,
+            'publickey_mod': format(self.rsa_full.n, 'x').upper(),
+            'publickey_exp': format(self.rsa_full.e, 'x').upper(),
+            'timestamp': '64861350000',
+        })
+
+    async def dologin(self, request):
+        self.logins += 1
+        response = web.json_response({
+            'success': True,
+            'oauth': json.dumps({'steamid': '76561197960287930', 'oauth_token': 'token'}),
+        })
+        response.set_cookie('steamLogin', 'loggedin', path='/')
+        return response
+
+    async def page(self, request):
+        self.page_requests += 1
+        if request.cookies.get('steamLogin') != 'loggedin':
+            raise web.HTTPFound('/login/home/?goto=page')
+        return web.Response(text='page')
+
+    async def games(self, request):
+        body = 'var rgGames = %s;' % json.dumps(self.game_list)
+        return web.Response(text=body, content_type='text/html')
+
+    async def login_page(self, request):
+        return web.Response(text='login')
+
+    def run_with_server(self, coro_func):
+        async def run():
+            app = web.Application()
+            app.router.add_post('/mobilelogin/getrsakey/', self.getrsakey)
+            app.router.add_post('/mobilelogin/dologin/', self.dologin)
+            app.router.add_get('/page', self.page)
+            app.router.add_get('/login/home/', self.login_page)
+            app.router.add_get('/games', self.games)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            base_url = 'http://127.0.0.1:%d' % runner.addresses[0][1]
+            swb = AsyncSteamWebBrowser('user', 'password')
+            swb.rsa_key_url = base_url + '/mobilelogin/getrsakey/'
+            swb.dologin_url = base_url + '/mobilelogin/dologin/'
+            try:
+                return await coro_func(swb, base_url)
+            finally:
+                await swb.close()
+                await runner.cleanup()
+        return self.loop.run_until_complete(run())
+
+    def test_login(self):
+        async def login(swb, base_url):
+            return await swb.login()
+        self.assertEqual(self.run_with_server(login), '76561197960287930')
+
+    def test_relogin_once(self):
+        ''' Concurrent requests on an expired session login only once '''
+        async def get_pages(swb, base_url):
+            return await asyncio.gather(*[swb.get(base_url + '/page') for _ in range(10)])
+        responses = self.run_with_server(get_pages)
+        self.assertEqual([r.text for r in responses], ['page'] * 10)
+        self.assertEqual(self.logins, 1)
+
+    def test_get_many(self):
+        async def get_many(swb, base_url):
+            return await swb.get_many([base_url + '/page'] * 5, max_workers=2)
+        responses = self.run_with_server(get_many)
+        self.assertEqual([r.text for url, r in responses], ['page'] * 5)
+        self.assertEqual(self.logins, 1)
+
+    def test_response_cache(self):
+        async def get_cached(swb, base_url):
+            swb.enable_response_cache([('/page', 60)])
+            await swb.get(base_url + '/page')
+            cached = await swb.get(base_url + '/page')
+            refreshed = await swb.get(base_url + '/page', force_refresh=True)
+            return cached, refreshed
+        cached, refreshed = self.run_with_server(get_cached)
+        self.assertEqual((cached.text, refreshed.text), ('page', 'page'))
+        # Expired session, page after login and the forced refresh
+        self.assertEqual(self.page_requests, 3)
+
+    def test_iter_json_array(self):
+        async def iter_games(swb, base_url):
+            results = []
+            for chunk_size in (1, 7, 16384):
+                results.append([g async for g in swb.iter_json_array(base_url + '/games', 'var rgGames = ',
+                                                                       chunk_size=chunk_size)])
+            return results
+        for games in self.run_with_server(iter_games):
+            self.assertEqual(games, self.game_list)
@@ -0,0 +1,104 @@
+import os
+import shutil
+import unittest
+import tempfile
+import httpretty
+import mock
+
+from steamweb.steamwebbrowser import (SteamWebBrowser, LoginFailedError, IncorrectLoginError, TwoFactorChallenge,
+                                      ChallengePendingError)
+from steamweb.filelock import FileLock
+from steamweb.steamwebbrowserpool import SteamWebBrowserPool, PoolError
+
+class TestSteamWebBrowserPool(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        os.environ['STEAMWEBROWSER_HOME'] = self.temp_dir
+
+    def tearDown(self):
+        if os.path.isdir(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+
+    @mock.patch.object(SteamWebBrowser, 'login')
+    @mock.patch.object(SteamWebBrowser, 'logged_in', return_value=False)
+    def test_lease(self, logged_in, login):
+        with SteamWebBrowserPool([('user1', 'pw1'), ('user2', 'pw2')]) as pool:
+            with pool.lease() as swb1:
+                with pool.lease() as swb2:
+                    self.assertIsNot(swb1, swb2)
+                    # Separate cookie jars on one shared adapter
+                    self.assertNotEqual(swb1.session.cookies.filename, swb2.session.cookies.filename)
+                    self.assertIs(swb1.session.get_adapter('https://steamcommunity.com'),
+                                    swb2.session.get_adapter('https://steamcommunity.com'))
+                    with self.assertRaises(PoolError):
+                        pool.acquire(timeout=0.01)
+            # Login is only done on first lease
+            with pool.lease():
+                pass
+            self.assertEqual(login.call_count, 2)
+
+    @mock.patch.object(SteamWebBrowser, 'logged_in', return_value=False)
+    def test_evict(self, logged_in):
+        with mock.patch.object(SteamWebBrowser, 'login', side_effect=LoginFailedError('Unable to login')) as login:
+            pool = SteamWebBrowserPool([('user1', 'pw1')], max_login_failures=2)
+            with self.assertRaises(PoolError):
+                pool.acquire()
+            self.assertEqual(login.call_count, 2)
+            self.assertIn('user1', pool.evicted)
+            self.assertEqual(len(pool), 0)
+
+        with mock.patch.object(SteamWebBrowser, 'login', side_effect=[IncorrectLoginError('Incorrect login.'), None]):
+            pool = SteamWebBrowserPool([('user1', 'pw1'), ('user2', 'pw2')])
+            swb = pool.acquire()
+            self.assertEqual(swb._username, b'user2')
+            self.assertIn('user1', pool.evicted)
+
+    @mock.patch.object(SteamWebBrowser, 'logged_in', return_value=False)
+    def test_challenge(self, logged_in):
+        challenges = []
+        with mock.patch.object(SteamWebBrowser, '_login_step', return_value=TwoFactorChallenge({})), \
+                mock.patch.object(SteamWebBrowser, 'resume_login', return_value='1') as resume_login:
+            pool = SteamWebBrowserPool([('user1', 'pw1'), ('user2', 'pw2')],
+                                       on_challenge=lambda username, c: challenges.append(username))
+            # Both accounts wait for a code, nothing to lease
+            with self.assertRaises(PoolError):
+                pool.acquire(timeout=0.01)
+            self.assertEqual(challenges, ['user1', 'user2'])
+            self.assertEqual(sorted(pool.pending), ['user1', 'user2'])
+
+            pool.solve('user2', 'code')
+            swb = pool.acquire(timeout=0.01)
+            self.assertEqual(swb._username, b'user2')
+            self.assertEqual(resume_login.call_args[0][0].code, 'code')
+            self.assertEqual(list(pool.pending), ['user1'])
+            pool.close()
+
+    @httpretty.activate
+    def test_challenge_relogin(self):
+        httpretty.register_uri(httpretty.GET, 'https://steamcommunity.com/page', status=302,
+                               location='https://steamcommunity.com/login/home/?goto=page')
+        challenges = []
+        pool = SteamWebBrowserPool([('user1', 'pw1')], on_challenge=lambda username, c: challenges.append(c))
+        with mock.patch.object(SteamWebBrowser, 'logged_in', return_value=True):
+            swb = pool.acquire()
+
+        # The session expires while leased, the login must not wait for the code
+        with mock.patch.object(SteamWebBrowser, '_login_step', return_value=TwoFactorChallenge({})):
+            with self.assertRaises(ChallengePendingError) as cm:
+                swb.get('https://steamcommunity.com/page')
+        self.assertEqual(challenges, [cm.exception.challenge])
+        pool.release(swb)
+        self.assertEqual(list(pool.pending), ['user1'])
+        # Other processes may login meanwhile
+        lease = FileLock(swb.session.cookies.filename + '.login')
+        self.assertTrue(lease.acquire(0))
+        lease.release()
+        with self.assertRaises(PoolError):
+            pool.acquire(timeout=0.01)
+
+        pool.solve('user1', 'code')
+        with mock.patch.object(SteamWebBrowser, 'resume_login', return_value='1') as resume_login:
+            self.assertIs(pool.acquire(timeout=0.01), swb)
+            self.assertEqual(resume_login.call_args[0][0].code, 'code')
+        self.assertEqual(pool.pending, {})
+        pool.close()
@@ -0,0 +1,30 @@
+import unittest
+
+from teamstacks import find_groups
+
+def normalized(groups):
+    return sorted(sorted(group) for group in groups)
+
+class TestFindGroups(unittest.TestCase):
+    def test_transitive(self):
+        friend_sets = {'a': {'b'}, 'b': {'a', 'c'}, 'c': {'b'}, 'd': set()}
+        self.assertEqual(normalized(find_groups('abcd', friend_sets)), [['a', 'b', 'c'], ['d']])
+
+    def test_one_sided(self):
+        # b's friend list is private or lacks a
+        friend_sets = {'a': {'b'}, 'b': set()}
+        self.assertEqual(normalized(find_groups('ab', friend_sets)), [['a', 'b']])
+
+    def test_friends_not_in_lobby(self):
+        # a and b are only connected via x, who is not in the game
+        friend_sets = {'a': {'x', 'y'}, 'b': {'x'}, 'x': {'a', 'b'}}
+        self.assertEqual(normalized(find_groups('ab', friend_sets)), [['a'], ['b']])
+
+    def test_missing_friend_sets(self):
+        friend_sets = {'a': {'c'}}
+        self.assertEqual(normalized(find_groups('abc', friend_sets)), [['a', 'c'], ['b']])
+
+    def test_large_friend_list(self):
+        # More friends than players, the players are looked up in the friend list
+        friend_sets = {'a': set('b%d' % i for i in range(100)) | {'b'}}
+        self.assertEqual(normalized(find_groups('abc', friend_sets)), [['a', 'b'], ['c']])